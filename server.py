@@ -6,21 +6,66 @@ A modern MCP server for web scraping and API interaction with human behavior sim
 
 import asyncio
 import json
+import os
 import random
+import ssl
+from contextlib import asynccontextmanager
 from typing import Dict, Any, List, Optional
 from urllib.parse import urljoin
 
 import aiohttp
-from bs4 import BeautifulSoup
 from fastmcp import FastMCP
+from lxml import etree
 from pydantic import BaseModel, Field, HttpUrl
 
-# Initialize MCP server
-mcp = FastMCP("web-interaction-toolkit")
-
 # Global API connections storage
 api_connections: Dict[str, Dict[str, Any]] = {}
 
+# Size of the body chunks fed to the incremental HTML parser
+STREAM_CHUNK_SIZE = 16384
+
+# Certificates are verified unless MCP_SSL_VERIFY=false is set explicitly
+SSL_VERIFY = os.getenv('MCP_SSL_VERIFY', 'true').lower() == 'true'
+
+
+def create_ssl_context() -> ssl.SSLContext:
+    """Build the TLS context shared by every outgoing connection"""
+    context = ssl.create_default_context()
+    if not SSL_VERIFY:
+        context.check_hostname = False
+        context.verify_mode = ssl.CERT_NONE
+    return context
+
+
+_ssl_context = create_ssl_context()
+
+# Shared client session so connections and TLS sessions are reused across calls
+_session: Optional[aiohttp.ClientSession] = None
+
+
+async def get_session() -> aiohttp.ClientSession:
+    """Get the shared client session, creating it on first use"""
+    global _session
+    if _session is None or _session.closed:
+        _session = aiohttp.ClientSession(
+            connector=aiohttp.TCPConnector(ssl=_ssl_context),
+            timeout=aiohttp.ClientTimeout(total=10)
+        )
+    return _session
+
+
+@asynccontextmanager
+async def server_lifespan(server: FastMCP):
+    """Close the shared HTTP session and its connector when the server shuts down"""
+    try:
+        yield
+    finally:
+        if _session is not None and not _session.closed:
+            await _session.close()
+
+# Initialize MCP server
+mcp = FastMCP("web-interaction-toolkit", lifespan=server_lifespan)
+
 
 class ScrapeOptions(BaseModel):
     """Options for web scraping"""
@@ -50,37 +95,42 @@ class APIMethodConfig(BaseModel):
     body: Dict[str, Any] = Field(default_factory=dict, description="Request body (for POST requests)")
 
 
+_USER_AGENTS = (
+    'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/121.0.0.0 Safari/537.36',
+    'Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/121.0.0.0 Safari/537.36',
+    'Mozilla/5.0 (Windows NT 10.0; Win64; x64; rv:122.0) Gecko/20100101 Firefox/122.0',
+    'Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/605.1.15 (KHTML, like Gecko) Version/17.2.1 Safari/605.1.15',
+    'Mozilla/5.0 (X11; Linux x86_64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/121.0.0.0 Safari/537.36'
+)
+
+# Constant part of the browser-like request headers; copied, never mutated
+_BASE_HEADERS = {
+    'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,image/webp,*/*;q=0.8',
+    'Accept-Language': 'en-US,en;q=0.5',
+    'Accept-Encoding': 'br, zstd, gzip, deflate',
+    'Connection': 'keep-alive',
+    'Upgrade-Insecure-Requests': '1'
+}
+
+
 def get_random_user_agent() -> str:
     """Generate a random user agent to simulate different browsers"""
-    user_agents = [
-        'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/121.0.0.0 Safari/537.36',
-        'Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/121.0.0.0 Safari/537.36',
-        'Mozilla/5.0 (Windows NT 10.0; Win64; x64; rv:122.0) Gecko/20100101 Firefox/122.0',
-        'Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/605.1.15 (KHTML, like Gecko) Version/17.2.1 Safari/605.1.15',
-        'Mozilla/5.0 (X11; Linux x86_64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/121.0.0.0 Safari/537.36'
-    ]
-    return random.choice(user_agents)
+    return random.choice(_USER_AGENTS)
 
 
 async def simulate_human_delay(min_delay: float = 0.5, max_delay: float = 2.0):
     """Simulate human-like delays between requests"""
-    delay = random.uniform(min_delay, max_delay)
+    delay = min_delay + (max_delay - min_delay) * random.random()
     await asyncio.sleep(delay)
 
 
 def prepare_request_headers(custom_headers: Optional[Dict[str, str]] = None) -> Dict[str, str]:
     """Prepare request headers with human-like characteristics"""
-    headers = {
-        'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,image/webp,*/*;q=0.8',
-        'Accept-Language': 'en-US,en;q=0.5',
-        'Accept-Encoding': 'gzip, deflate',
-        'Connection': 'keep-alive',
-        'Upgrade-Insecure-Requests': '1',
-        'User-Agent': get_random_user_agent()
-    }
+    headers = _BASE_HEADERS.copy()
+    headers['User-Agent'] = get_random_user_agent()
     
     # Add referer for some requests to appear more natural
-    if random.choice([True, False]):
+    if random.getrandbits(1):
         headers['Referer'] = 'https://www.google.com/'
     
     # Add custom headers if provided
@@ -90,6 +140,47 @@ def prepare_request_headers(custom_headers: Optional[Dict[str, str]] = None) ->
     return headers
 
 
+async def parse_html_stream(response: aiohttp.ClientResponse, options: ScrapeOptions) -> etree._Element:
+    """
+    Feed the response body to an incremental HTML parser, stopping early once
+    the page has produced enough text, links and images for the requested limits
+    """
+    try:
+        parser = etree.HTMLPullParser(events=('end',), encoding=response.charset)
+    except LookupError:
+        # Unknown charset label; let libxml2 detect the encoding itself
+        parser = etree.HTMLPullParser(events=('end',), encoding=None)
+    text_length = link_count = image_count = 0
+    
+    async for chunk in response.content.iter_chunked(STREAM_CHUNK_SIZE):
+        parser.feed(chunk)
+        for _, element in parser.read_events():
+            tag = element.tag
+            if tag == 'a':
+                if element.get('href') is not None:
+                    link_count += 1
+            elif tag == 'img':
+                if element.get('src') is not None:
+                    image_count += 1
+            elif tag not in ('script', 'style') and element.text:
+                # Rough count, only used to decide when to stop reading
+                text_length += len(element.text.strip())
+        
+        if (text_length >= options.max_content_length
+                and link_count >= options.max_links
+                and image_count >= options.max_images):
+            # Leaving the response context releases the unread remainder
+            break
+    
+    try:
+        root = parser.close()
+    except etree.XMLSyntaxError:
+        # Raised for an empty body (e.g. 204 responses)
+        root = None
+    # Whitespace- or comment-only bodies close to None; both become an empty page
+    return root if root is not None else etree.Element('html')
+
+
 @mcp.tool()
 async def scrape_webpage(
     url: str,
@@ -115,53 +206,57 @@ async def scrape_webpage(
         else:
             headers = {'User-Agent': get_random_user_agent()}
         
-        timeout = aiohttp.ClientTimeout(total=10)
-        async with aiohttp.ClientSession(timeout=timeout) as session:
-            async with session.get(url, headers=headers, ssl=False) as response:
-                response.raise_for_status()
-                content = await response.text()
-                
-                # Parse the content
-                soup = BeautifulSoup(content, 'lxml')
-                
-                # Extract title
-                title = soup.title.string if soup.title else "No title found"
-                
-                # Extract text content
-                for script in soup(["script", "style"]):
-                    script.decompose()
-                text = soup.get_text()
-                lines = (line.strip() for line in text.splitlines())
-                chunks = (phrase.strip() for line in lines for phrase in line.split("  "))
-                text = ' '.join(chunk for chunk in chunks if chunk)
-                
-                # Extract links
-                links = []
-                for link in soup.find_all('a', href=True):
-                    absolute_url = urljoin(url, link['href'])
-                    links.append({
-                        'text': link.get_text().strip(),
-                        'url': absolute_url
-                    })
-                
-                # Extract images
-                images = []
-                for img in soup.find_all('img', src=True):
-                    absolute_url = urljoin(url, img['src'])
-                    images.append({
-                        'alt': img.get('alt', ''),
-                        'url': absolute_url
-                    })
-                
-                return {
-                    "success": True,
-                    "url": url,
-                    "title": title,
-                    "content": text[:options.max_content_length],
-                    "links": links[:options.max_links],
-                    "images": images[:options.max_images],
-                    "status_code": response.status
-                }
+        session = await get_session()
+        async with session.get(url, headers=headers) as response:
+            response.raise_for_status()
+            status_code = response.status
+            root = await parse_html_stream(response, options)
+        
+        # Extract title
+        title = root.findtext('.//title') or "No title found"
+        
+        # Extract links
+        links = []
+        for link in root.iter('a'):
+            href = link.get('href')
+            if href is None:
+                continue
+            links.append({
+                'text': ''.join(link.itertext()).strip(),
+                'url': urljoin(url, href)
+            })
+            if len(links) >= options.max_links:
+                break
+        
+        # Extract images
+        images = []
+        for img in root.iter('img'):
+            src = img.get('src')
+            if src is None:
+                continue
+            images.append({
+                'alt': img.get('alt', ''),
+                'url': urljoin(url, src)
+            })
+            if len(images) >= options.max_images:
+                break
+        
+        # Extract text content
+        etree.strip_elements(root, 'script', 'style', with_tail=False)
+        text = ''.join(root.itertext())
+        lines = (line.strip() for line in text.splitlines())
+        chunks = (phrase.strip() for line in lines for phrase in line.split("  "))
+        text = ' '.join(chunk for chunk in chunks if chunk)
+        
+        return {
+            "success": True,
+            "url": url,
+            "title": title,
+            "content": text[:options.max_content_length],
+            "links": links,
+            "images": images,
+            "status_code": status_code
+        }
                 
     except Exception as e:
         return {
@@ -188,12 +283,56 @@ async def create_api_connection(
     api_connections[config.name] = {
         "base_url": str(config.base_url).rstrip('/'),
         "default_headers": config.default_headers,
-        "methods": {}
+        "methods": {},
+        "callers": {}
     }
     
     return f"API connection '{config.name}' created successfully with base URL: {config.base_url}"
 
 
+def make_api_caller(connection: Dict[str, Any], method: Dict[str, Any]):
+    """
+    Pre-bind everything about an API method that is fixed at registration time
+    
+    The returned coroutine only merges the per-call overrides and sends the request.
+    """
+    url = connection["base_url"] + method["endpoint"]
+    http_method = method["method"]
+    base_headers = {**connection["default_headers"], **method["headers"]}
+    base_params = method["params"]
+    base_body = method["body"] if http_method == "POST" else None
+    
+    async def call(params: Optional[Dict[str, Any]] = None, body: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        headers = {**base_headers, **prepare_request_headers()}
+        request_params = {**base_params, **params} if params else base_params
+        request_body = None
+        if base_body is not None:
+            request_body = {**base_body, **body} if body else base_body
+        
+        session = await get_session()
+        async with session.request(
+            http_method,
+            url,
+            headers=headers,
+            params=request_params,
+            json=request_body
+        ) as response:
+            response.raise_for_status()
+            try:
+                response_data = await response.json()
+            except (aiohttp.ContentTypeError, ValueError):
+                response_data = {"content": await response.text()}
+            
+            return {
+                "success": True,
+                "status_code": response.status,
+                "headers": dict(response.headers),
+                "data": response_data
+            }
+    
+    return call
+
+
 @mcp.tool()
 async def add_api_method(
     config: APIMethodConfig
@@ -210,13 +349,16 @@ async def add_api_method(
     if config.connection_name not in api_connections:
         return f"API connection '{config.connection_name}' not found"
     
-    api_connections[config.connection_name]["methods"][config.method_name] = {
+    connection = api_connections[config.connection_name]
+    method = {
         "method": config.http_method,
         "endpoint": config.endpoint,
         "headers": config.headers,
         "params": config.params,
         "body": config.body
     }
+    connection["methods"][config.method_name] = method
+    connection["callers"][config.method_name] = make_api_caller(connection, method)
     
     return f"Method '{config.method_name}' added to API connection '{config.connection_name}'"
 
@@ -249,84 +391,17 @@ async def execute_api_call(
     if method_name not in connection["methods"]:
         return {"success": False, "error": f"Method '{method_name}' not found in connection '{connection_name}'"}
     
-    method = connection["methods"][method_name]
-    
     # Simulate human delay if requested
     if simulate_human:
         await simulate_human_delay(0.5, 1.5)
     
     try:
-        # Prepare headers
-        headers = connection["default_headers"].copy()
-        headers.update(method["headers"])
-        headers.update(prepare_request_headers())
-        
-        # Prepare URL
-        url = connection["base_url"] + method["endpoint"]
-        
-        # Prepare parameters and body
-        request_params = method["params"].copy()
-        if params:
-            request_params.update(params)
-        
-        request_body = method["body"].copy()
-        if body:
-            request_body.update(body)
-        
-        timeout = aiohttp.ClientTimeout(total=10)
-        async with aiohttp.ClientSession(timeout=timeout) as session:
-            if method["method"] == "GET":
-                async with session.get(
-                    url,
-                    headers=headers,
-                    params=request_params,
-                    ssl=False
-                ) as response:
-                    response.raise_for_status()
-                    try:
-                        response_data = await response.json()
-                    except:
-                        response_data = {"content": await response.text()}
-                    
-                    return {
-                        "success": True,
-                        "status_code": response.status,
-                        "headers": dict(response.headers),
-                        "data": response_data
-                    }
-            
-            elif method["method"] == "POST":
-                async with session.post(
-                    url,
-                    headers=headers,
-                    params=request_params,
-                    json=request_body,
-                    ssl=False
-                ) as response:
-                    response.raise_for_status()
-                    try:
-                        response_data = await response.json()
-                    except:
-                        response_data = {"content": await response.text()}
-                    
-                    return {
-                        "success": True,
-                        "status_code": response.status,
-                        "headers": dict(response.headers),
-                        "data": response_data
-                    }
-    
+        return await connection["callers"][method_name](params, body)
     except Exception as e:
         return {
             "success": False,
             "error": str(e)
         }
-    
-    # Default return for unsupported methods
-    return {
-        "success": False,
-        "error": f"Unsupported HTTP method: {method.get('method', 'unknown')}"
-    }
 
 
 @mcp.tool()
@@ -393,8 +468,19 @@ async def get_connection_resource(name: str) -> str:
     }, indent=2)
 
 
+def install_uvloop() -> bool:
+    """Run the server on uvloop's event loop when it is installed"""
+    try:
+        import uvloop
+    except ImportError:
+        return False
+    asyncio.set_event_loop_policy(uvloop.EventLoopPolicy())
+    return True
+
+
 def main():
     """Main entry point for the MCP server"""
+    install_uvloop()
     mcp.run()
 
 
@@ -5,25 +5,36 @@ With security fixes, performance optimizations, and reliability improvements
 """
 
 import asyncio
-import json
+import hashlib
+import ipaddress
 import os
 import random
 import re
 import secrets
 import time
-from typing import Dict, Any, List, Optional, Tuple
-from urllib.parse import urljoin, urlparse
-from datetime import datetime, timedelta
+from typing import Callable, Deque, Dict, Any, List, Optional, Tuple
+from urllib.parse import urljoin, urlparse, urlsplit
+from collections import deque
+from datetime import datetime, timedelta, timezone
 from functools import lru_cache
+from html import unescape as unescape_html
 from contextlib import asynccontextmanager
 import logging
 
 import aiohttp
+import orjson
 from aiohttp import TCPConnector, ClientTimeout
-from bs4 import BeautifulSoup
 from fastmcp import FastMCP
 from pydantic import BaseModel, Field, HttpUrl, field_validator
-import bleach
+import lxml.html
+from lxml import etree
+from lxml.cssselect import CSSSelector
+from lxml.html.clean import Cleaner
+
+try:
+    import nh3
+except ImportError:  # Fall back to lxml's cleaner where no nh3 wheel is available
+    nh3 = None
 
 # Configure structured logging
 logging.basicConfig(
@@ -32,8 +43,17 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+@asynccontextmanager
+async def server_lifespan(server: FastMCP):
+    """Close pooled HTTP sessions when the server shuts down"""
+    try:
+        yield
+    finally:
+        await auth_session_manager.close_all()
+        await session_manager.close()
+
 # Initialize MCP server
-mcp = FastMCP("web-interaction-toolkit-enhanced")
+mcp = FastMCP("web-interaction-toolkit-enhanced", lifespan=server_lifespan)
 
 # ============================================================================
 # Configuration and Environment Variables
@@ -47,10 +67,13 @@ class Config:
     # Performance - Sensible defaults
     MAX_CONNECTIONS = int(os.getenv('MCP_MAX_CONNECTIONS', '100'))
     MAX_CONNECTIONS_PER_HOST = int(os.getenv('MCP_MAX_CONNECTIONS_PER_HOST', '10'))
+    MAX_HTML_BYTES = int(os.getenv('MCP_MAX_HTML_BYTES', str(2 * 1024 * 1024)))
     
     # Caching - Enabled by default with 5 minute TTL
     ENABLE_CACHE = os.getenv('MCP_ENABLE_CACHE', 'true').lower() == 'true'
     CACHE_TTL_SECONDS = int(os.getenv('MCP_CACHE_TTL', '300'))
+    # How long past its TTL an entry may still be served while a site's circuit is open
+    CACHE_STALE_SECONDS = int(os.getenv('MCP_CACHE_STALE_SECONDS', '3600'))
     
     # Reliability
     MAX_RETRIES = int(os.getenv('MCP_MAX_RETRIES', '3'))
@@ -109,6 +132,7 @@ class SessionManager:
                         limit=Config.MAX_CONNECTIONS,
                         limit_per_host=Config.MAX_CONNECTIONS_PER_HOST,
                         ttl_dns_cache=300,
+                        keepalive_timeout=60,
                         enable_cleanup_closed=True
                     )
                     timeout = ClientTimeout(total=Config.TIMEOUT_SECONDS)
@@ -119,6 +143,11 @@ class SessionManager:
                     logger.info(f"Created new session with connection pool (max: {Config.MAX_CONNECTIONS})")
         return self._session
     
+    @property
+    def session(self) -> Optional[aiohttp.ClientSession]:
+        """The current session, if one has been created, without creating one"""
+        return self._session
+    
     async def close(self):
         """Close the session and connector"""
         if self._session:
@@ -134,58 +163,61 @@ session_manager = SessionManager()
 # ============================================================================
 
 class RateLimiter:
-    """Simple rate limiter per domain with automatic cleanup"""
+    """Sliding-window rate limiter per domain with automatic cleanup"""
+    
+    # try_acquire never awaits, so it runs atomically on the event loop and
+    # needs no lock
     
     def __init__(self, max_requests: int = 60, period: int = 60):
         self.max_requests = max_requests
         self.period = period  # seconds
-        self.requests: Dict[str, List[datetime]] = {}
-        self._lock = asyncio.Lock()
-        self._last_cleanup = time.time()
+        # Per-domain time.monotonic() stamps of requests in the window, oldest first
+        self.requests: Dict[str, Deque[float]] = {}
+        self._last_cleanup = time.monotonic()
+    
+    def try_acquire(self, domain: str) -> bool:
+        """Record a request for domain if it is within the rate limit"""
+        now = time.monotonic()
+        cutoff = now - self.period
+        
+        # Periodic cleanup to prevent memory leak (every 5 minutes)
+        if now - self._last_cleanup > 300:
+            for d in [d for d, window in self.requests.items() if not window or window[-1] <= cutoff]:
+                del self.requests[d]
+            self._last_cleanup = now
+        
+        window = self.requests.get(domain)
+        if window is None:
+            window = self.requests[domain] = deque()
+        
+        # Drop requests that have left the window
+        while window and window[0] <= cutoff:
+            window.popleft()
+        
+        # Check if we're within limit
+        if len(window) >= self.max_requests:
+            return False
+        
+        window.append(now)
+        return True
+    
+    def retry_after(self, domain: str) -> float:
+        """Seconds until the oldest request for domain leaves the window"""
+        window = self.requests.get(domain)
+        if not window:
+            return 0.0
+        return max(window[0] + self.period - time.monotonic(), 0.0)
     
     async def check_rate_limit(self, domain: str) -> bool:
         """Check if request is within rate limit"""
-        async with self._lock:
-            now = datetime.now()
-            current_time = time.time()
-            
-            # Periodic cleanup to prevent memory leak (every 5 minutes)
-            if current_time - self._last_cleanup > 300:
-                cutoff = now - timedelta(seconds=self.period)
-                # Clean all domains
-                for d in list(self.requests.keys()):
-                    self.requests[d] = [
-                        req_time for req_time in self.requests[d]
-                        if req_time > cutoff
-                    ]
-                    # Remove domain if no recent requests
-                    if not self.requests[d]:
-                        del self.requests[d]
-                self._last_cleanup = current_time
-            
-            if domain not in self.requests:
-                self.requests[domain] = []
-            
-            # Remove old requests outside the period
-            cutoff = now - timedelta(seconds=self.period)
-            self.requests[domain] = [
-                req_time for req_time in self.requests[domain]
-                if req_time > cutoff
-            ]
-            
-            # Check if we're within limit
-            if len(self.requests[domain]) >= self.max_requests:
-                return False
-            
-            # Add current request
-            self.requests[domain].append(now)
-            return True
+        return self.try_acquire(domain)
     
     async def wait_if_needed(self, domain: str):
         """Wait if rate limit is exceeded"""
-        while not await self.check_rate_limit(domain):
-            logger.warning(f"Rate limit exceeded for {domain}, waiting...")
-            await asyncio.sleep(1)
+        while not self.try_acquire(domain):
+            delay = self.retry_after(domain)
+            logger.warning(f"Rate limit exceeded for {domain}, waiting {delay:.1f}s...")
+            await asyncio.sleep(delay)
 
 # Global rate limiter
 rate_limiter = RateLimiter(Config.RATE_LIMIT_REQUESTS, Config.RATE_LIMIT_PERIOD)
@@ -197,49 +229,45 @@ rate_limiter = RateLimiter(Config.RATE_LIMIT_REQUESTS, Config.RATE_LIMIT_PERIOD)
 class CircuitBreaker:
     """Circuit breaker for failing endpoints"""
     
+    # No method awaits between reading and updating state, so each call is
+    # atomic on the event loop and needs no lock
+    
     def __init__(self, failure_threshold: int = 5, recovery_timeout: int = 60):
         self.failure_threshold = failure_threshold
         self.recovery_timeout = recovery_timeout
         self.failures: Dict[str, int] = {}
-        self.last_failure_time: Dict[str, datetime] = {}
-        self._lock = asyncio.Lock()
+        self.last_failure_time: Dict[str, float] = {}  # time.monotonic() values
     
     async def is_open(self, endpoint: str) -> bool:
         """Check if circuit is open for endpoint"""
-        async with self._lock:
-            if endpoint not in self.failures:
-                return False
-            
-            # Check if recovery period has passed
-            if endpoint in self.last_failure_time:
-                time_since_failure = (datetime.now() - self.last_failure_time[endpoint]).seconds
-                if time_since_failure > self.recovery_timeout:
-                    # Reset circuit
-                    self.failures[endpoint] = 0
-                    del self.last_failure_time[endpoint]
-                    logger.info(f"Circuit breaker reset for {endpoint}")
-                    return False
-            
-            return self.failures[endpoint] >= self.failure_threshold
+        failures = self.failures.get(endpoint)
+        if not failures:
+            return False
+        
+        # Check if recovery period has passed
+        last_failure = self.last_failure_time.get(endpoint)
+        if last_failure is not None and time.monotonic() - last_failure > self.recovery_timeout:
+            # Reset circuit
+            self.failures.pop(endpoint, None)
+            self.last_failure_time.pop(endpoint, None)
+            logger.info(f"Circuit breaker reset for {endpoint}")
+            return False
+        
+        return failures >= self.failure_threshold
     
     async def record_success(self, endpoint: str):
         """Record successful request"""
-        async with self._lock:
-            if endpoint in self.failures:
-                self.failures[endpoint] = 0
-                if endpoint in self.last_failure_time:
-                    del self.last_failure_time[endpoint]
+        self.failures.pop(endpoint, None)
+        self.last_failure_time.pop(endpoint, None)
     
     async def record_failure(self, endpoint: str):
         """Record failed request"""
-        async with self._lock:
-            if endpoint not in self.failures:
-                self.failures[endpoint] = 0
-            self.failures[endpoint] += 1
-            self.last_failure_time[endpoint] = datetime.now()
-            
-            if self.failures[endpoint] >= self.failure_threshold:
-                logger.error(f"Circuit breaker opened for {endpoint}")
+        failures = self.failures.get(endpoint, 0) + 1
+        self.failures[endpoint] = failures
+        self.last_failure_time[endpoint] = time.monotonic()
+        
+        if failures >= self.failure_threshold:
+            logger.error(f"Circuit breaker opened for {endpoint}")
 
 # Global circuit breaker
 circuit_breaker = CircuitBreaker()
@@ -251,50 +279,54 @@ circuit_breaker = CircuitBreaker()
 class CacheManager:
     """Simple in-memory cache with TTL"""
     
-    def __init__(self, ttl_seconds: int = 300):
+    def __init__(self, ttl_seconds: int = 300, stale_seconds: int = 0):
         self.cache: Dict[str, Tuple[Any, datetime]] = {}
         self.ttl = timedelta(seconds=ttl_seconds)
+        # Expired entries are kept this much longer for allow_stale lookups
+        self.retention = self.ttl + timedelta(seconds=stale_seconds)
         self._lock = asyncio.Lock()
     
-    def _get_cache_key(self, url: str, options: dict = None) -> str:
-        """Generate cache key from URL and options"""
-        key_data = f"{url}:{json.dumps(options or {}, sort_keys=True)}"
-        # Use a simple string key instead of MD5 hash
-        return key_data.replace('/', '_').replace(':', '_')[:100]
+    def _get_cache_key(self, url: str, options_key: str = '') -> str:
+        """Generate cache key from URL and an options fingerprint"""
+        return f"{url}#{options_key}"
     
-    async def get(self, url: str, options: dict = None) -> Optional[Any]:
-        """Get cached value if not expired"""
+    async def get(self, url: str, options_key: str = '', allow_stale: bool = False) -> Optional[Any]:
+        """Get cached value if not expired, or within the stale window if allow_stale"""
         if not Config.ENABLE_CACHE:
             return None
             
         async with self._lock:
-            key = self._get_cache_key(url, options)
+            key = self._get_cache_key(url, options_key)
             if key in self.cache:
                 value, timestamp = self.cache[key]
-                if datetime.now() - timestamp < self.ttl:
+                age = datetime.now() - timestamp
+                if age < self.ttl:
                     logger.debug(f"Cache hit for {url}")
                     return value
-                else:
+                elif age >= self.retention:
                     del self.cache[key]
+                elif allow_stale:
+                    logger.debug(f"Stale cache hit for {url}")
+                    return value
         return None
     
-    async def set(self, url: str, value: Any, options: dict = None):
+    async def set(self, url: str, value: Any, options_key: str = ''):
         """Set cache value with current timestamp"""
         if not Config.ENABLE_CACHE:
             return
             
         async with self._lock:
-            key = self._get_cache_key(url, options)
+            key = self._get_cache_key(url, options_key)
             self.cache[key] = (value, datetime.now())
             logger.debug(f"Cached result for {url}")
             
             # Clean up old entries if cache grows too large (prevent memory leak)
             if len(self.cache) > 1000:
-                # Remove expired entries
+                # Remove entries past their stale window
                 now = datetime.now()
                 self.cache = {
                     k: v for k, v in self.cache.items()
-                    if now - v[1] < self.ttl
+                    if now - v[1] < self.retention
                 }
                 # If still too large, remove oldest entries
                 if len(self.cache) > 800:
@@ -307,7 +339,7 @@ class CacheManager:
             self.cache.clear()
 
 # Global cache manager
-cache_manager = CacheManager(Config.CACHE_TTL_SECONDS)
+cache_manager = CacheManager(Config.CACHE_TTL_SECONDS, Config.CACHE_STALE_SECONDS)
 
 # ============================================================================
 # Retry Logic with Exponential Backoff
@@ -361,71 +393,112 @@ class ScrapeOptions(BaseModel):
         if v > 60:
             raise ValueError("Delay must be less than 60 seconds")
         return v
+    
+    def fingerprint(self) -> str:
+        """Stable digest of the options that shape a scrape result, for cache keys"""
+        fields = self.model_dump(exclude={'min_delay', 'max_delay', 'use_cache'})
+        return hashlib.blake2b(orjson.dumps(fields, option=orjson.OPT_SORT_KEYS), digest_size=16).hexdigest()
 
 # ============================================================================
 # Enhanced Helper Functions
 # ============================================================================
 
+_ALLOWED_SCHEMES = frozenset({'http', 'https'})
+_IMAGE_SCHEMES = _ALLOWED_SCHEMES | {'data'}
+_BLOCKED_HOSTS = frozenset({'localhost', '127.0.0.1', '0.0.0.0', '::1'})
+
 def validate_url(url: str) -> bool:
     """Validate URL to prevent XSS and other attacks"""
     try:
-        parsed = urlparse(url)
+        parsed = urlsplit(url)
         # Only allow http and https schemes
-        if parsed.scheme not in ('http', 'https'):
+        if parsed.scheme not in _ALLOWED_SCHEMES:
             logger.warning(f"Rejected URL with scheme: {parsed.scheme}")
             return False
         # Must have a valid netloc (domain)
         if not parsed.netloc:
             return False
-        # Reject localhost and private IPs for security
-        if parsed.netloc.lower() in ('localhost', '127.0.0.1', '0.0.0.0'):
+        # Reject localhost for security; hostname is already lowercased and
+        # stripped of port and IPv6 brackets
+        host = parsed.hostname
+        if not host:
+            return False
+        if host in _BLOCKED_HOSTS:
             logger.warning(f"Rejected localhost URL: {url}")
             return False
+        # Reject private, loopback, link-local and reserved IP literals;
+        # ordinary hostnames fail to parse and are accepted
+        try:
+            ip = ipaddress.ip_address(host)
+        except ValueError:
+            return True
+        if ip.is_private or ip.is_loopback or ip.is_link_local or ip.is_reserved or ip.is_unspecified:
+            logger.warning(f"Rejected private network URL: {url}")
+            return False
         return True
     except Exception:
         return False
 
+_USER_AGENTS = (
+    'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/121.0.0.0 Safari/537.36',
+    'Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/121.0.0.0 Safari/537.36',
+    'Mozilla/5.0 (Windows NT 10.0; Win64; x64; rv:122.0) Gecko/20100101 Firefox/122.0',
+    'Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/605.1.15 (KHTML, like Gecko) Version/17.2.1 Safari/605.1.15',
+    'Mozilla/5.0 (X11; Linux x86_64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/121.0.0.0 Safari/537.36',
+    'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Edge/121.0.0.0',
+    'Mozilla/5.0 (iPad; CPU OS 17_2 like Mac OS X) AppleWebKit/605.1.15 (KHTML, like Gecko) Version/17.2 Mobile/15E148 Safari/604.1'
+)
+
+# Constant part of the browser-like request headers; copied, never mutated
+_BASE_HEADERS = {
+    'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,image/webp,*/*;q=0.8',
+    'Accept-Language': 'en-US,en;q=0.9',
+    'Accept-Encoding': 'br, zstd, gzip, deflate',
+    'Connection': 'keep-alive',
+    'Upgrade-Insecure-Requests': '1',
+    'Cache-Control': 'max-age=0',
+    'Sec-Fetch-Dest': 'document',
+    'Sec-Fetch-Mode': 'navigate',
+    'Sec-Fetch-Site': 'none',
+    'Sec-Fetch-User': '?1'
+}
+
+_REFERERS = (
+    'https://www.google.com/',
+    'https://www.bing.com/',
+    'https://duckduckgo.com/'
+)
+
+def now_iso() -> str:
+    """Current UTC time as an ISO 8601 string, for result timestamps"""
+    return datetime.now(timezone.utc).isoformat()
+
 def get_random_user_agent() -> str:
     """Generate a random user agent to simulate different browsers"""
-    user_agents = [
-        'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/121.0.0.0 Safari/537.36',
-        'Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/121.0.0.0 Safari/537.36',
-        'Mozilla/5.0 (Windows NT 10.0; Win64; x64; rv:122.0) Gecko/20100101 Firefox/122.0',
-        'Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/605.1.15 (KHTML, like Gecko) Version/17.2.1 Safari/605.1.15',
-        'Mozilla/5.0 (X11; Linux x86_64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/121.0.0.0 Safari/537.36',
-        'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Edge/121.0.0.0',
-        'Mozilla/5.0 (iPad; CPU OS 17_2 like Mac OS X) AppleWebKit/605.1.15 (KHTML, like Gecko) Version/17.2 Mobile/15E148 Safari/604.1'
-    ]
-    return random.choice(user_agents)
+    return random.choice(_USER_AGENTS)
+
+@lru_cache(maxsize=1)
+def _default_headers(slot: int) -> Dict[str, str]:
+    return {'User-Agent': get_random_user_agent()}
+
+def default_request_headers() -> Dict[str, str]:
+    """Minimal headers for requests that don't simulate a human; the user agent
+    rotates hourly. The returned dict is shared and must not be modified."""
+    return _default_headers(int(time.monotonic() // 3600))
 
 async def simulate_human_delay(min_delay: float = 0.5, max_delay: float = 2.0):
     """Simulate human-like delays between requests"""
-    delay = random.uniform(min_delay, max_delay)
+    delay = min_delay + (max_delay - min_delay) * random.random()
     await asyncio.sleep(delay)
 
 def prepare_request_headers(custom_headers: Optional[Dict[str, str]] = None) -> Dict[str, str]:
     """Prepare request headers with human-like characteristics"""
-    headers = {
-        'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,image/webp,*/*;q=0.8',
-        'Accept-Language': 'en-US,en;q=0.9',
-        'Accept-Encoding': 'gzip, deflate, br',
-        'Connection': 'keep-alive',
-        'Upgrade-Insecure-Requests': '1',
-        'User-Agent': get_random_user_agent(),
-        'Cache-Control': 'max-age=0',
-        'Sec-Fetch-Dest': 'document',
-        'Sec-Fetch-Mode': 'navigate',
-        'Sec-Fetch-Site': 'none',
-        'Sec-Fetch-User': '?1'
-    }
+    headers = _BASE_HEADERS.copy()
+    headers['User-Agent'] = get_random_user_agent()
     
     # Add referer for some requests to appear more natural
-    if random.choice([True, False]):
-        headers['Referer'] = random.choice([
-            'https://www.google.com/',
-            'https://www.bing.com/',
-            'https://duckduckgo.com/'
-        ])
+    if random.getrandbits(1):
+        headers['Referer'] = random.choice(_REFERERS)
     
     # Add custom headers if provided
     if custom_headers:
@@ -433,19 +506,131 @@ def prepare_request_headers(custom_headers: Optional[Dict[str, str]] = None) ->
         
     return headers
 
+# lxml rejects str input carrying an XML encoding declaration, so decoded
+# pages are handed to the parser as UTF-8 bytes with the encoding pinned.
+# Nothing reads comments or looks elements up by id, so skip both
+_HTML_PARSER = lxml.html.HTMLParser(
+    encoding='utf-8',
+    remove_comments=True,
+    collect_ids=False,
+    huge_tree=False
+)
+
+# Removes active content from a parsed page before its text is extracted
+_CONTENT_CLEANER = Cleaner(
+    scripts=True,
+    javascript=True,
+    comments=True,
+    style=True,
+    embedded=True,
+    safe_attrs_only=True,
+    page_structure=False
+)
+
+# Full text of the first <title>, or '' when there is none
+_TITLE_XPATH = etree.XPath('string(//title)')
+
+def parse_html(content: str) -> lxml.html.HtmlElement:
+    """Parse decoded HTML into an lxml document tree"""
+    try:
+        return lxml.html.document_fromstring(content.encode('utf-8'), parser=_HTML_PARSER)
+    except etree.ParserError:
+        # Empty bodies (e.g. 204 responses) parse to an empty document
+        return _HTML_PARSER.makeelement('html')
+
+def extract_page_text(doc: lxml.html.HtmlElement, clean: bool = False) -> Tuple[str, str]:
+    """Return the title and whitespace-normalized text of a parsed page.
+    Scripts and styles are removed from doc in place, or with clean=True the
+    full content cleaner is run over it"""
+    title = _TITLE_XPATH(doc).strip()
+    if clean:
+        _CONTENT_CLEANER(doc)
+    else:
+        etree.strip_elements(doc, 'script', 'style', with_tail=False)
+    return title, normalize_whitespace(doc.text_content())
+
+# Strong references to fire-and-forget tasks so they are not garbage collected
+_background_tasks: set = set()
+
+def run_in_background(coro) -> asyncio.Task:
+    """Schedule a coroutine without waiting for it to finish"""
+    task = asyncio.create_task(coro)
+    _background_tasks.add(task)
+    task.add_done_callback(_background_tasks.discard)
+    return task
+
+_WS_RE = re.compile(r'\s+')
+
+def normalize_whitespace(text: str) -> str:
+    """Collapse runs of whitespace in extracted page text to single spaces"""
+    return _WS_RE.sub(' ', text).strip()
+
+def make_url_resolver(base_url: str) -> Callable[[str], str]:
+    """Build a resolver for links found on base_url. Absolute and root-relative
+    references are joined directly; anything else, including paths with dot
+    segments that urljoin would normalize, goes through urljoin"""
+    base = urlsplit(base_url)
+    origin = f"{base.scheme}://{base.netloc}"
+    
+    def resolve(href: str) -> str:
+        if href.startswith(('http://', 'https://')):
+            return href
+        if href.startswith('/') and not href.startswith('//') and '/.' not in href:
+            return origin + href
+        return urljoin(base_url, href)
+    
+    return resolve
+
+def url_scheme(url: str) -> str:
+    """Lowercased scheme of an absolute URL, without a full parse"""
+    return url.partition(':')[0].lower()
+
+async def read_bounded_text(response: aiohttp.ClientResponse, limit: int = Config.MAX_HTML_BYTES) -> str:
+    """Read at most `limit` bytes of a response body and decode them"""
+    buf = bytearray()
+    async for chunk in response.content.iter_chunked(65536):
+        buf.extend(chunk)
+        if len(buf) >= limit:
+            del buf[limit:]
+            break
+    try:
+        return buf.decode(response.charset or 'utf-8', errors='replace')
+    except LookupError:  # Unknown charset label
+        return buf.decode('utf-8', errors='replace')
+
+# Tags and attributes that survive HTML sanitization
+_ALLOWED_TAGS = frozenset({
+    'p', 'br', 'span', 'div', 'h1', 'h2', 'h3', 'h4', 'h5', 'h6',
+    'ul', 'ol', 'li', 'a', 'img', 'strong', 'em', 'code', 'pre'
+})
+_ALLOWED_ATTRIBUTES = {'a': frozenset({'href', 'title'}), 'img': frozenset({'src', 'alt'})}
+
+# Same allow-list for the lxml fallback, which cannot scope attributes per tag
+_FRAGMENT_CLEANER = Cleaner(
+    allow_tags=_ALLOWED_TAGS,
+    remove_unknown_tags=False,
+    safe_attrs_only=True,
+    safe_attrs=frozenset().union(*_ALLOWED_ATTRIBUTES.values()),
+    scripts=True,
+    javascript=True,
+    comments=True,
+    style=True
+)
+
 def sanitize_html_content(html_content: str) -> str:
     """Sanitize HTML content to prevent XSS attacks"""
-    # Allow only safe tags and attributes
-    allowed_tags = ['p', 'br', 'span', 'div', 'h1', 'h2', 'h3', 'h4', 'h5', 'h6',
-                   'ul', 'ol', 'li', 'a', 'img', 'strong', 'em', 'code', 'pre']
-    allowed_attributes = {'a': ['href', 'title'], 'img': ['src', 'alt']}
-    
-    return bleach.clean(
-        html_content,
-        tags=allowed_tags,
-        attributes=allowed_attributes,
-        strip=True
-    )
+    if nh3 is not None:
+        return nh3.clean(
+            html_content,
+            tags=_ALLOWED_TAGS,
+            attributes=_ALLOWED_ATTRIBUTES,
+            strip_comments=True
+        )
+    
+    fragment = lxml.html.fragment_fromstring(html_content, create_parent='div')
+    _FRAGMENT_CLEANER(fragment)
+    # Drop the wrapping <div> and </div> added by create_parent
+    return lxml.html.tostring(fragment, encoding='unicode')[5:-6]
 
 # ============================================================================
 # Persistent Session Management for Authentication
@@ -456,67 +641,89 @@ class AuthSessionManager:
     
     def __init__(self):
         self._sessions: Dict[str, aiohttp.ClientSession] = {}
-        self._cookies: Dict[str, Dict] = {}
-        self._lock = asyncio.Lock()
+        self._cookies: Dict[str, aiohttp.CookieJar] = {}
+        self._session_locks: Dict[str, asyncio.Lock] = {}
+        self._connector: Optional[TCPConnector] = None
+    
+    def _get_connector(self) -> TCPConnector:
+        """Connection pool shared by all authenticated sessions, created on first use"""
+        if self._connector is None or self._connector.closed:
+            self._connector = TCPConnector(
+                limit=Config.MAX_CONNECTIONS,
+                limit_per_host=Config.MAX_CONNECTIONS_PER_HOST,
+                ttl_dns_cache=300,
+                enable_cleanup_closed=True
+            )
+        return self._connector
+    
+    def _get_session_lock(self, session_id: str) -> asyncio.Lock:
+        """Get the lock guarding one session, so sessions never wait on each other"""
+        lock = self._session_locks.get(session_id)
+        if lock is None:
+            # No await between the lookup and the insert, so this cannot race
+            lock = self._session_locks[session_id] = asyncio.Lock()
+        return lock
     
     async def get_or_create_session(self, session_id: str) -> aiohttp.ClientSession:
         """Get or create a persistent session for a specific user/domain"""
-        async with self._lock:
-            if session_id not in self._sessions or self._sessions[session_id].closed:
-                connector = TCPConnector(
-                    limit=Config.MAX_CONNECTIONS,
-                    limit_per_host=Config.MAX_CONNECTIONS_PER_HOST
-                )
+        # Fast path: existing sessions are returned without taking any lock
+        session = self._sessions.get(session_id)
+        if session is not None and not session.closed:
+            return session
+        
+        async with self._get_session_lock(session_id):
+            session = self._sessions.get(session_id)
+            if session is None or session.closed:
                 timeout = ClientTimeout(total=Config.TIMEOUT_SECONDS)
                 
-                # Create session with cookie jar
-                self._sessions[session_id] = aiohttp.ClientSession(
-                    connector=connector,
+                # Reuse the saved cookie jar so domain, path and expiry survive
+                cookie_jar = self._cookies.get(session_id)
+                if cookie_jar is None:
+                    cookie_jar = aiohttp.CookieJar()
+                
+                # Sessions borrow the shared pool; closing one leaves it open
+                session = aiohttp.ClientSession(
+                    connector=self._get_connector(),
+                    connector_owner=False,
                     timeout=timeout,
-                    cookie_jar=aiohttp.CookieJar()
+                    cookie_jar=cookie_jar
                 )
                 
-                # Restore cookies if they exist
-                if session_id in self._cookies:
-                    self._sessions[session_id].cookie_jar.update_cookies(self._cookies[session_id])
-                
+                self._sessions[session_id] = session
                 logger.info(f"Created authenticated session for {session_id}")
             
-            return self._sessions[session_id]
+            return session
     
     async def save_cookies(self, session_id: str):
         """Save cookies from a session"""
-        async with self._lock:
-            if session_id in self._sessions:
-                session = self._sessions[session_id]
-                if isinstance(session, tuple):
-                    session, _ = session
-                # Properly extract cookies from CookieJar
-                cookies = {}
-                for cookie in session.cookie_jar:
-                    cookies[cookie.key] = cookie.value
-                self._cookies[session_id] = cookies
+        # A single reference store with no await in between, so it needs no
+        # lock and there is nothing to batch
+        session = self._sessions.get(session_id)
+        if session is not None:
+            # Keep the jar itself; it outlives the session that filled it
+            self._cookies[session_id] = session.cookie_jar
     
     async def close_session(self, session_id: str):
         """Close a specific session"""
-        async with self._lock:
-            if session_id in self._sessions:
-                session = self._sessions[session_id]
-                if isinstance(session, tuple):
-                    session, _ = session
+        async with self._get_session_lock(session_id):
+            session = self._sessions.pop(session_id, None)
+            if session is not None:
                 await session.close()
-                del self._sessions[session_id]
                 logger.info(f"Closed session for {session_id}")
+        self._session_locks.pop(session_id, None)
     
     async def close_all(self):
         """Close all sessions"""
-        async with self._lock:
-            for item in self._sessions.values():
-                session = item[0] if isinstance(item, tuple) else item
-                await session.close()
-            self._sessions.clear()
-            self._cookies.clear()  # Also clear cookies to prevent memory leak
-            logger.info("Closed all authenticated sessions")
+        sessions = list(self._sessions.values())
+        self._sessions.clear()
+        self._cookies.clear()  # Also clear cookies to prevent memory leak
+        self._session_locks.clear()
+        for session in sessions:
+            await session.close()
+        if self._connector is not None:
+            await self._connector.close()
+            self._connector = None
+        logger.info("Closed all authenticated sessions")
 
 # Global authenticated session manager
 auth_session_manager = AuthSessionManager()
@@ -525,14 +732,53 @@ auth_session_manager = AuthSessionManager()
 # Form Detection and Parsing
 # ============================================================================
 
-def extract_form_fields(soup: BeautifulSoup, form_selector: Optional[str] = None) -> Dict[str, Any]:
-    """Extract form fields from HTML with CAPTCHA detection"""
+# CAPTCHA markers mapped to the provider they indicate, most specific first.
+# A search only returns the leftmost marker, so every match is collected and
+# the highest-priority one reports the type
+_CAPTCHA_TYPES = {
+    'g-recaptcha': 'Google reCAPTCHA',
+    'recaptcha': 'reCAPTCHA',
+    'h-captcha': 'hCaptcha',
+    'cf-turnstile': 'Cloudflare Turnstile',
+    'captcha': 'Generic CAPTCHA'
+}
+_CAPTCHA_RE = re.compile('|'.join(map(re.escape, _CAPTCHA_TYPES)), re.IGNORECASE)
+_CAPTCHA_PRIORITY = {marker: rank for rank, marker in enumerate(_CAPTCHA_TYPES)}
+
+# Attribute values and text inside a form that mention a CAPTCHA marker.
+# Every marker contains 'captcha' except 'cf-turnstile'; translate() lowercases
+# just the letters those two words need
+_CAPTCHA_FOLD = "translate(., 'ACEFHILNPRSTU', 'acefhilnprstu')"
+_CAPTCHA_XPATH = etree.XPath(
+    f".//@*[contains({_CAPTCHA_FOLD}, 'captcha') or contains({_CAPTCHA_FOLD}, 'cf-turnstile')]"
+    f" | .//text()[contains({_CAPTCHA_FOLD}, 'captcha') or contains({_CAPTCHA_FOLD}, 'cf-turnstile')]"
+)
+
+@lru_cache(maxsize=512)
+def compile_selector(selector: str) -> CSSSelector:
+    """Compile a CSS selector to XPath once and reuse it for later calls"""
+    return CSSSelector(selector, translator='html')
+
+def extract_form_fields(
+    doc: lxml.html.HtmlElement,
+    form_selector: Optional[str] = None,
+    max_forms: Optional[int] = None
+) -> List[Dict[str, Any]]:
+    """
+    Extract form fields from a parsed HTML document with CAPTCHA detection
+    
+    Args:
+        doc: Parsed HTML document
+        form_selector: CSS selector for the forms to extract (all forms if omitted)
+        max_forms: Stop after this many forms; callers that submit only the
+            first form pass 1 to skip the rest of the page
+    """
     forms = []
     
     if form_selector:
-        form_elements = soup.select(form_selector)
+        form_elements = compile_selector(form_selector)(doc)
     else:
-        form_elements = soup.find_all('form')
+        form_elements = doc.iter('form')
     
     for form in form_elements:
         form_data = {
@@ -545,31 +791,42 @@ def extract_form_fields(soup: BeautifulSoup, form_selector: Optional[str] = None
             'captcha_type': None
         }
         
-        # Check for CAPTCHA indicators
-        captcha_indicators = [
-            ('recaptcha', 'reCAPTCHA'),
-            ('g-recaptcha', 'Google reCAPTCHA'),
-            ('h-captcha', 'hCaptcha'),
-            ('captcha', 'Generic CAPTCHA'),
-            ('cf-turnstile', 'Cloudflare Turnstile')
-        ]
-        
-        form_html = str(form).lower()
-        for indicator, captcha_type in captcha_indicators:
-            if indicator in form_html:
-                form_data['has_captcha'] = True
-                form_data['captcha_type'] = captcha_type
-                logger.warning(f"CAPTCHA detected in form: {captcha_type}")
-                break
-        
-        # Extract input fields
-        for input_field in form.find_all('input'):
-            field_name = input_field.get('name')
+        # Check for CAPTCHA indicators by querying the tree rather than
+        # serializing the form; every hit is classified, as a generic label
+        # can come before the provider's widget
+        captcha_hits = _CAPTCHA_XPATH(form)
+        if captcha_hits:
+            markers = {m.group(0).lower() for hit in captcha_hits for m in _CAPTCHA_RE.finditer(hit)}
+            marker = min(markers, key=_CAPTCHA_PRIORITY.__getitem__, default='captcha')
+            form_data['has_captcha'] = True
+            form_data['captcha_type'] = _CAPTCHA_TYPES[marker]
+            logger.warning(f"CAPTCHA detected in form: {form_data['captcha_type']}")
+        
+        # Extract input, select and textarea fields in one walk of the form
+        for field in form.iter('input', 'select', 'textarea'):
+            field_name = field.get('name')
             if not field_name:
                 continue
             
-            field_type = input_field.get('type', 'text')
-            field_value = input_field.get('value', '')
+            if field.tag == 'select':
+                options = [option.get('value', option.text_content()) for option in field.iter('option')]
+                form_data['fields'][field_name] = {
+                    'type': 'select',
+                    'options': options,
+                    'required': field.get('required') is not None
+                }
+                continue
+            
+            if field.tag == 'textarea':
+                form_data['fields'][field_name] = {
+                    'type': 'textarea',
+                    'value': field.text_content(),
+                    'required': field.get('required') is not None
+                }
+                continue
+            
+            field_type = field.get('type', 'text')
+            field_value = field.get('value', '')
             
             if field_type == 'hidden':
                 form_data['hidden_fields'][field_name] = field_value
@@ -582,31 +839,12 @@ def extract_form_fields(soup: BeautifulSoup, form_selector: Optional[str] = None
                 form_data['fields'][field_name] = {
                     'type': field_type,
                     'value': field_value,
-                    'required': input_field.get('required') is not None
-                }
-        
-        # Extract select fields
-        for select in form.find_all('select'):
-            field_name = select.get('name')
-            if field_name:
-                options = [option.get('value', option.text) for option in select.find_all('option')]
-                form_data['fields'][field_name] = {
-                    'type': 'select',
-                    'options': options,
-                    'required': select.get('required') is not None
-                }
-        
-        # Extract textarea fields
-        for textarea in form.find_all('textarea'):
-            field_name = textarea.get('name')
-            if field_name:
-                form_data['fields'][field_name] = {
-                    'type': 'textarea',
-                    'value': textarea.text,
-                    'required': textarea.get('required') is not None
+                    'required': field.get('required') is not None
                 }
         
         forms.append(form_data)
+        if max_forms is not None and len(forms) >= max_forms:
+            break
     
     return forms
 
@@ -614,24 +852,13 @@ def extract_form_fields(soup: BeautifulSoup, form_selector: Optional[str] = None
 # Enhanced MCP Tools
 # ============================================================================
 
-@mcp.tool()
-async def scrape_webpage(
-    url: str,
-    options: Optional[ScrapeOptions] = None
-) -> Dict[str, Any]:
-    """
-    Enhanced webpage scraping with security, caching, and reliability
-    
-    Args:
-        url: The URL to scrape
-        options: Enhanced scraping options
-        
-    Returns:
-        Dictionary containing page content, links, images, and metadata
-    """
-    if options is None:
-        options = ScrapeOptions()
-    
+# Response headers worth returning (and caching) with a scrape result
+_KEEP_HEADERS = frozenset({
+    'content-type', 'content-length', 'etag', 'last-modified', 'cache-control', 'server'
+})
+
+async def _scrape_webpage(url: str, options: ScrapeOptions) -> Dict[str, Any]:
+    """Scrape a single page; shared by the single and batch scraping tools"""
     # Input validation with security checks
     if not validate_url(url):
         raise ValueError(f"Invalid or potentially malicious URL: {url}")
@@ -640,26 +867,35 @@ async def scrape_webpage(
     
     domain = parsed_url.netloc
     
+    options_key = options.fingerprint() if options.use_cache else ''
+    
     try:
         # Check cache first
         if options.use_cache:
-            cached_result = await cache_manager.get(url, options.dict())
+            cached_result = await cache_manager.get(url, options_key)
             if cached_result:
                 return cached_result
         
-        # Check circuit breaker
+        # Check circuit breaker; while it is open, fall back to an expired
+        # cache entry rather than failing outright
         if await circuit_breaker.is_open(domain):
+            if options.use_cache:
+                stale_result = await cache_manager.get(url, options_key, allow_stale=True)
+                if stale_result:
+                    logger.warning(f"Circuit breaker is open for {domain}, serving stale result for {url}")
+                    return {**stale_result, "cached": True, "stale": True}
             raise CircuitBreakerError(f"Circuit breaker is open for {domain}")
         
-        # Apply rate limiting
-        await rate_limiter.wait_if_needed(domain)
+        # Apply rate limiting; only suspend when the domain is over its limit
+        if not rate_limiter.try_acquire(domain):
+            await rate_limiter.wait_if_needed(domain)
         
         # Simulate human delay if requested
         if options.simulate_human:
             await simulate_human_delay(options.min_delay, options.max_delay)
         
         # Prepare headers
-        headers = prepare_request_headers() if options.simulate_human else {'User-Agent': get_random_user_agent()}
+        headers = prepare_request_headers() if options.simulate_human else default_request_headers()
         
         # Execute request with retry logic
         async def make_request():
@@ -671,7 +907,7 @@ async def scrape_webpage(
                 allow_redirects=options.follow_redirects
             ) as response:
                 response.raise_for_status()
-                return await response.text(), response.status, response.headers
+                return await read_bounded_text(response), response.status, response.headers
         
         content, status_code, response_headers = await retry_with_backoff(make_request)
         
@@ -679,71 +915,69 @@ async def scrape_webpage(
         await circuit_breaker.record_success(domain)
         
         # Parse the content
-        soup = BeautifulSoup(content, 'lxml')
-        
-        # Extract title
-        title = soup.title.string if soup.title else "No title found"
-        
-        # Extract text content
-        for script in soup(["script", "style"]):
-            script.decompose()
-        text = soup.get_text()
-        lines = (line.strip() for line in text.splitlines())
-        chunks = (phrase.strip() for line in lines for phrase in line.split("  "))
-        text = ' '.join(chunk for chunk in chunks if chunk)
-        
-        # Sanitize content if requested
-        if options.sanitize_content:
-            text = sanitize_html_content(text)
+        doc = parse_html(content)
         
         # Extract links with validation
+        resolve_url = make_url_resolver(url)
         links = []
-        for link in soup.find_all('a', href=True)[:options.max_links * 2]:  # Get extra to filter
+        seen = set()
+        for link in doc.iter('a'):
+            if len(links) >= options.max_links:
+                break
+            href = link.get('href')
+            if href is None or href in seen:  # Nav bars and footers repeat links
+                continue
+            seen.add(href)
             try:
-                absolute_url = urljoin(url, link['href'])
-                parsed = urlparse(absolute_url)
-                if parsed.scheme in ['http', 'https']:
+                absolute_url = resolve_url(href)
+                if url_scheme(absolute_url) in _ALLOWED_SCHEMES:
                     links.append({
-                        'text': link.get_text().strip()[:100],  # Limit text length
+                        'text': link.text_content().strip()[:100],  # Limit text length
                         'url': absolute_url
                     })
-                    if len(links) >= options.max_links:
-                        break
             except Exception as e:
                 logger.debug(f"Skipping invalid link: {e}")
         
         # Extract images with validation
         images = []
-        for img in soup.find_all('img', src=True)[:options.max_images * 2]:
+        seen.clear()
+        for img in doc.iter('img'):
+            if len(images) >= options.max_images:
+                break
+            src = img.get('src')
+            if src is None or src in seen:
+                continue
+            seen.add(src)
             try:
-                absolute_url = urljoin(url, img['src'])
-                parsed = urlparse(absolute_url)
-                if parsed.scheme in ['http', 'https', 'data']:
+                absolute_url = resolve_url(src)
+                if url_scheme(absolute_url) in _IMAGE_SCHEMES:
                     images.append({
                         'alt': img.get('alt', '')[:100],
                         'url': absolute_url if not absolute_url.startswith('data:') else 'data:...'
                     })
-                    if len(images) >= options.max_images:
-                        break
             except Exception as e:
                 logger.debug(f"Skipping invalid image: {e}")
         
+        # Extract title and text; sanitizing cleans the tree in place, which
+        # also drops scripts and styles
+        title, text = extract_page_text(doc, clean=options.sanitize_content)
+        
         result = {
             "success": True,
             "url": url,
-            "title": title,
+            "title": title or "No title found",
             "content": text[:options.max_content_length],
             "links": links,
             "images": images,
             "status_code": status_code,
-            "headers": dict(response_headers),
+            "headers": {k: v for k, v in response_headers.items() if k.lower() in _KEEP_HEADERS},
             "cached": False,
-            "timestamp": datetime.now().isoformat()
+            "timestamp": now_iso()
         }
         
-        # Cache the result
+        # Cache the result without holding up the response
         if options.use_cache:
-            await cache_manager.set(url, result, options.dict())
+            run_in_background(cache_manager.set(url, result, options_key))
         
         logger.info(f"Successfully scraped {url} (status: {status_code})")
         return result
@@ -760,12 +994,73 @@ async def scrape_webpage(
             "error": str(e),
             "error_type": type(e).__name__,
             "content": "",
-            "timestamp": datetime.now().isoformat()
+            "timestamp": now_iso()
         }
         
         logger.error(f"Failed to scrape {url}: {e}")
         return error_result
 
+@mcp.tool()
+async def scrape_webpage(
+    url: str,
+    options: Optional[ScrapeOptions] = None
+) -> Dict[str, Any]:
+    """
+    Enhanced webpage scraping with security, caching, and reliability
+    
+    Args:
+        url: The URL to scrape
+        options: Enhanced scraping options
+        
+    Returns:
+        Dictionary containing page content, links, images, and metadata
+    """
+    if options is None:
+        options = ScrapeOptions()
+    
+    return await _scrape_webpage(url, options)
+
+@mcp.tool()
+async def scrape_webpages(
+    urls: List[str],
+    options: Optional[ScrapeOptions] = None,
+    concurrency: int = 20
+) -> List[Dict[str, Any]]:
+    """
+    Scrape multiple webpages concurrently over the shared connection pool
+    
+    Args:
+        urls: The URLs to scrape
+        options: Enhanced scraping options applied to every URL
+        concurrency: Maximum number of pages fetched at the same time
+        
+    Returns:
+        List of scrape results in the same order as the input URLs
+    """
+    if options is None:
+        options = ScrapeOptions()
+    
+    semaphore = asyncio.Semaphore(max(1, concurrency))
+    
+    async def scrape_one(url: str) -> Dict[str, Any]:
+        async with semaphore:
+            return await _scrape_webpage(url, options)
+    
+    results = await asyncio.gather(*(scrape_one(url) for url in urls), return_exceptions=True)
+    
+    # Invalid URLs and open circuit breakers raise; report them per URL instead
+    return [
+        result if not isinstance(result, Exception) else {
+            "success": False,
+            "url": url,
+            "error": str(result),
+            "error_type": type(result).__name__,
+            "content": "",
+            "timestamp": now_iso()
+        }
+        for url, result in zip(urls, results)
+    ]
+
 @mcp.tool()
 async def clear_cache() -> Dict[str, Any]:
     """Clear all cached scraping results"""
@@ -773,9 +1068,23 @@ async def clear_cache() -> Dict[str, Any]:
     return {
         "success": True,
         "message": "Cache cleared successfully",
-        "timestamp": datetime.now().isoformat()
+        "timestamp": now_iso()
     }
 
+# Page text that suggests a login went through
+_LOGIN_SUCCESS_RE = re.compile(
+    '|'.join(map(re.escape, ('logout', 'sign out', 'dashboard', 'welcome', 'profile', 'my account'))),
+    re.IGNORECASE
+)
+_TITLE_RE = re.compile(r'<title[^>]*>([^<]{0,300})</title>', re.IGNORECASE)
+
+def looks_logged_in(page_html: str, username: str) -> bool:
+    """Guess from the raw HTML of a post-login page whether the login worked"""
+    if _LOGIN_SUCCESS_RE.search(page_html):
+        return True
+    # Case-insensitive match, so the whole page never needs lowercasing
+    return bool(username) and re.search(re.escape(username), page_html, re.IGNORECASE) is not None
+
 @mcp.tool()
 async def login_to_website(
     login_url: str,
@@ -813,10 +1122,9 @@ async def login_to_website(
         headers = prepare_request_headers()
         async with session.get(login_url, headers=headers, ssl=Config.SSL_VERIFY) as response:
             html = await response.text()
-            soup = BeautifulSoup(html, 'lxml')
         
         # Extract form fields
-        forms = extract_form_fields(soup, form_selector)
+        forms = extract_form_fields(parse_html(html), form_selector, max_forms=1)
         if not forms:
             return {
                 "success": False,
@@ -852,7 +1160,7 @@ async def login_to_website(
         await simulate_human_delay(1, 3)
         
         # Submit login form
-        headers = prepare_request_headers({'Referer': login_url})
+        headers = {**headers, 'Referer': login_url}
         
         if form['method'] == 'POST':
             async with session.post(
@@ -880,15 +1188,10 @@ async def login_to_website(
         # Save cookies for future use
         await auth_session_manager.save_cookies(session_id)
         
-        # Check for common login success indicators
-        soup = BeautifulSoup(result_html, 'lxml')
-        success_indicators = [
-            'logout', 'sign out', 'dashboard', 'welcome', 'profile',
-            username.lower(), 'my account'
-        ]
-        
-        page_text = soup.get_text().lower()
-        login_successful = any(indicator in page_text for indicator in success_indicators)
+        # Check for common login success indicators; a substring check on the
+        # raw HTML is enough, so skip building a tree
+        login_successful = looks_logged_in(result_html, username)
+        title_match = _TITLE_RE.search(result_html)
         
         # Check if we're still on the login page (likely failed)
         if urlparse(final_url).path == urlparse(login_url).path and not login_successful:
@@ -902,9 +1205,9 @@ async def login_to_website(
             "session_id": session_id,
             "final_url": final_url,
             "status_code": status_code,
-            "page_title": soup.title.string if soup.title else None,
+            "page_title": unescape_html(title_match.group(1)).strip() if title_match else None,
             "message": "Login submitted. Use the session_id for authenticated requests.",
-            "timestamp": datetime.now().isoformat()
+            "timestamp": now_iso()
         }
         
     except Exception as e:
@@ -947,10 +1250,9 @@ async def submit_form(
         headers = prepare_request_headers()
         async with session.get(url, headers=headers, ssl=Config.SSL_VERIFY) as response:
             html = await response.text()
-            soup = BeautifulSoup(html, 'lxml')
         
         # Extract forms
-        forms = extract_form_fields(soup, form_selector)
+        forms = extract_form_fields(parse_html(html), form_selector, max_forms=1)
         if not forms:
             # If no form found, try direct submission
             form = {'action': url, 'method': method or 'POST', 'hidden_fields': {}}
@@ -976,7 +1278,7 @@ async def submit_form(
         await simulate_human_delay()
         
         # Submit form
-        headers = prepare_request_headers({'Referer': url})
+        headers = {**headers, 'Referer': url}
         
         if method == 'POST':
             async with session.post(
@@ -1002,15 +1304,10 @@ async def submit_form(
                 status_code = response.status
         
         # Parse results
-        soup = BeautifulSoup(result_html, 'lxml')
+        doc = parse_html(result_html)
         
         # Extract text content
-        for script in soup(["script", "style"]):
-            script.decompose()
-        text = soup.get_text()
-        lines = (line.strip() for line in text.splitlines())
-        chunks = (phrase.strip() for line in lines for phrase in line.split("  "))
-        text = ' '.join(chunk for chunk in chunks if chunk)
+        title, text = extract_page_text(doc)
         
         logger.info(f"Form submitted to {action_url} with {len(submit_data)} fields")
         
@@ -1018,10 +1315,10 @@ async def submit_form(
             "success": True,
             "final_url": final_url,
             "status_code": status_code,
-            "page_title": soup.title.string if soup.title else None,
+            "page_title": title or None,
             "content": text[:5000],
             "session_id": session_id,
-            "timestamp": datetime.now().isoformat()
+            "timestamp": now_iso()
         }
         
     except Exception as e:
@@ -1031,6 +1328,39 @@ async def submit_form(
             "error": str(e)
         }
 
+# Every element that any of the common search result container patterns
+# could match, collected in one pass over the document
+_RESULT_CANDIDATES_XPATH = etree.XPath(
+    "//div[contains(@class, 'result') or contains(@class, 'search')]"
+    " | //article"
+    " | //li[contains(@class, 'result')]"
+)
+
+def group_search_results(doc: lxml.html.HtmlElement) -> List[List[lxml.html.HtmlElement]]:
+    """Group result container candidates by pattern, most specific first:
+    div.result, div.search-result, article, li.result, div[class*=result],
+    div[class*=search]. An element lands in every group it matches"""
+    groups = [[] for _ in range(6)]
+    for element in _RESULT_CANDIDATES_XPATH(doc):
+        if element.tag == 'article':
+            groups[2].append(element)
+            continue
+        classes = element.get('class', '')
+        tokens = classes.split()
+        if element.tag == 'li':
+            if 'result' in tokens:
+                groups[3].append(element)
+            continue
+        if 'result' in tokens:
+            groups[0].append(element)
+        if 'search-result' in tokens:
+            groups[1].append(element)
+        if 'result' in classes:
+            groups[4].append(element)
+        if 'search' in classes:
+            groups[5].append(element)
+    return groups
+
 @mcp.tool()
 async def search_website(
     search_url: str,
@@ -1062,22 +1392,23 @@ async def search_website(
             headers = prepare_request_headers()
             async with session.get(search_url, headers=headers, ssl=Config.SSL_VERIFY) as response:
                 html = await response.text()
-                soup = BeautifulSoup(html, 'lxml')
+            doc = parse_html(html)
             
             # Common search field names
             common_names = ['q', 'query', 'search', 's', 'keyword', 'search_query', 'searchterm']
             
             # Try to find search input
+            input_names = {field.get('name') for field in doc.iter('input')}
             for name in common_names:
-                if soup.find('input', {'name': name}):
+                if name in input_names:
                     search_field_name = name
                     break
             
             # If still not found, look for any input with type="search"
             if not search_field_name:
-                search_input = soup.find('input', {'type': 'search'})
-                if search_input and search_input.get('name'):
-                    search_field_name = search_input['name']
+                search_input = doc.find('.//input[@type="search"]')
+                if search_input is not None and search_input.get('name'):
+                    search_field_name = search_input.get('name')
             
             # Default to 'q' if nothing found
             if not search_field_name:
@@ -1100,37 +1431,31 @@ async def search_website(
             status_code = response.status
         
         # Parse results
-        soup = BeautifulSoup(result_html, 'lxml')
+        doc = parse_html(result_html)
         
         # Extract search results (generic approach)
         results = []
         
         # Look for common result containers
-        result_selectors = [
-            'div.result', 'div.search-result', 'article', 'li.result',
-            'div[class*="result"]', 'div[class*="search"]'
-        ]
-        
-        for selector in result_selectors:
-            elements = soup.select(selector)
+        for elements in group_search_results(doc):
             if elements:
                 for element in elements[:20]:  # Limit to 20 results
                     result = {}
                     
                     # Try to extract title
-                    title_elem = element.find(['h1', 'h2', 'h3', 'h4', 'h5', 'h6', 'a'])
-                    if title_elem:
-                        result['title'] = title_elem.get_text().strip()
+                    title_elem = next(element.iterdescendants('h1', 'h2', 'h3', 'h4', 'h5', 'h6', 'a'), None)
+                    if title_elem is not None:
+                        result['title'] = title_elem.text_content().strip()
                     
                     # Try to extract URL
-                    link_elem = element.find('a', href=True)
-                    if link_elem:
-                        result['url'] = urljoin(final_url, link_elem['href'])
+                    link_elem = element.find('.//a[@href]')
+                    if link_elem is not None:
+                        result['url'] = urljoin(final_url, link_elem.get('href'))
                     
                     # Try to extract description
-                    desc_elem = element.find(['p', 'span', 'div'])
-                    if desc_elem:
-                        result['description'] = desc_elem.get_text().strip()[:200]
+                    desc_elem = next(element.iterdescendants('p', 'span', 'div'), None)
+                    if desc_elem is not None:
+                        result['description'] = desc_elem.text_content().strip()[:200]
                     
                     if result:
                         results.append(result)
@@ -1147,9 +1472,9 @@ async def search_website(
             "results": results,
             "final_url": final_url,
             "status_code": status_code,
-            "page_title": soup.title.string if soup.title else None,
+            "page_title": _TITLE_XPATH(doc).strip() or None,
             "session_id": session_id,
-            "timestamp": datetime.now().isoformat()
+            "timestamp": now_iso()
         }
         
     except Exception as e:
@@ -1189,7 +1514,7 @@ async def scrape_with_session(
             await simulate_human_delay(options.min_delay, options.max_delay)
         
         # Prepare headers
-        headers = prepare_request_headers() if options.simulate_human else {'User-Agent': get_random_user_agent()}
+        headers = prepare_request_headers() if options.simulate_human else default_request_headers()
         
         # Make request with authenticated session
         async with session.get(
@@ -1199,36 +1524,24 @@ async def scrape_with_session(
             allow_redirects=options.follow_redirects
         ) as response:
             response.raise_for_status()
-            content = await response.text()
+            content = await read_bounded_text(response)
             status_code = response.status
         
-        # Parse content (similar to regular scrape)
-        soup = BeautifulSoup(content, 'lxml')
-        title = soup.title.string if soup.title else "No title found"
-        
-        # Extract text
-        for script in soup(["script", "style"]):
-            script.decompose()
-        text = soup.get_text()
-        lines = (line.strip() for line in text.splitlines())
-        chunks = (phrase.strip() for line in lines for phrase in line.split("  "))
-        text = ' '.join(chunk for chunk in chunks if chunk)
-        
-        # Sanitize if requested
-        if options.sanitize_content:
-            text = sanitize_html_content(text)
+        # Parse content the same way as the regular scrape, cleaning active
+        # content out of the tree when sanitizing is requested
+        title, text = extract_page_text(parse_html(content), clean=options.sanitize_content)
         
         logger.info(f"Scraped {url} with authenticated session {session_id}")
         
         return {
             "success": True,
             "url": url,
-            "title": title,
+            "title": title or "No title found",
             "content": text[:options.max_content_length],
             "status_code": status_code,
             "session_id": session_id,
             "authenticated": True,
-            "timestamp": datetime.now().isoformat()
+            "timestamp": now_iso()
         }
         
     except Exception as e:
@@ -1248,7 +1561,7 @@ async def close_session(session_id: str) -> Dict[str, Any]:
         return {
             "success": True,
             "message": f"Session {session_id} closed successfully",
-            "timestamp": datetime.now().isoformat()
+            "timestamp": now_iso()
         }
     except Exception as e:
         return {
@@ -1259,7 +1572,8 @@ async def close_session(session_id: str) -> Dict[str, Any]:
 @mcp.tool()
 async def get_health_status() -> Dict[str, Any]:
     """Get health status of the server"""
-    session = await session_manager.get_session()
+    # Report on the pooled session without creating one just for the probe
+    session = session_manager.session
     
     return {
         "success": True,
@@ -1272,10 +1586,10 @@ async def get_health_status() -> Dict[str, Any]:
             "rate_limit": f"{Config.RATE_LIMIT_REQUESTS} requests per {Config.RATE_LIMIT_PERIOD} seconds"
         },
         "session": {
-            "active": not session.closed,
-            "connector_limit": session.connector.limit if session.connector else None
+            "active": session is not None and not session.closed,
+            "connector_limit": Config.MAX_CONNECTIONS
         },
-        "timestamp": datetime.now().isoformat()
+        "timestamp": now_iso()
     }
 
 # ============================================================================
@@ -1284,102 +1598,186 @@ async def get_health_status() -> Dict[str, Any]:
 
 from pathlib import Path
 
+# API endpoint references: quoted API/auth paths, fetch() calls and axios
+# calls, matched in a single scan. Exactly one group captures the URL.
+# URL runs are capped at 256 characters so an unterminated quote in a large
+# page can't make each attempt scan to the end of the input (ReDoS)
+_API_ENDPOINT_RE = re.compile(
+    r'(?<=["\'])(/(?:api|auth)/[^"\'\s]{1,256}|/(?:login|signin|session|token)[^"\'\s]{0,256})(?=["\'])'
+    r'|fetch\s{0,16}\(\s{0,16}["\']([^"\'\s]{1,256})["\']'
+    r'|axios\.[a-z]{1,16}\s{0,16}\(\s{0,16}["\']([^"\'\s]{1,256})["\']',
+    re.IGNORECASE
+)
+
+# URL keywords that mark an endpoint as a login
+_LOGIN_KW_RE = re.compile(r'login|auth|signin', re.IGNORECASE)
+
+# File extensions of static assets that are never API endpoints
+_STATIC_EXTS = ('.css', '.js', '.jpg', '.png', '.gif', '.svg', '.woff', '.woff2', '.ico')
+
+@lru_cache(maxsize=1024)
+def domain_for_url(url: str) -> str:
+    """Lowercased host of a URL without any leading 'www.', as used to name
+    discovery files and sessions"""
+    return urlsplit(url).netloc.lower().removeprefix('www.')
+
+def is_login_endpoint(endpoint: Dict[str, Any]) -> bool:
+    """Whether a discovered endpoint looks like a login. Records saved before
+    endpoints carried an is_login flag are classified from their URL"""
+    if 'is_login' in endpoint:
+        return endpoint['is_login']
+    return endpoint.get('method') == 'POST' and _LOGIN_KW_RE.search(endpoint['url']) is not None
+
+# Endpoint fields that may carry credentials and must never be written to disk
+_SECRET_ENDPOINT_KEYS = frozenset({'verified_payload'})
+
 class APIDiscoveryManager:
     """Manages API endpoint discovery and caching"""
     
     def __init__(self, storage_dir: str = ".api_discovery"):
         self.storage_dir = Path(storage_dir)
         self.storage_dir.mkdir(exist_ok=True)
+        # Parsed discovery files by domain, with the st_mtime_ns they were read at.
+        # Only touched on the event loop, so lookups need no lock
+        self._cache: Dict[str, Tuple[int, Dict]] = {}
+        # Saves read, merge and replace a file in a worker thread; one lock per
+        # domain keeps concurrent saves from overwriting each other's endpoints
+        self._save_locks: Dict[str, asyncio.Lock] = {}
         
     def get_domain(self, url: str) -> str:
         """Extract domain from URL"""
-        parsed = urlparse(url)
-        domain = parsed.netloc.lower()
-        if domain.startswith('www.'):
-            domain = domain[4:]
-        return domain
+        return domain_for_url(url)
         
     def discover_endpoints(self, url: str, html: str) -> Dict[str, Any]:
         """Discover API endpoints from HTML/JavaScript"""
-        endpoints = []
+        if not html:
+            return []
+        # A JSON body (e.g. an API response passed as html_content) is data,
+        # not page or script source, so there are no endpoint references to scan
+        if html[:64].lstrip()[:1] in ('{', '[') and 'html' not in html[:256].lower():
+            return []
         
-        # API endpoint patterns
-        patterns = [
-            r'["\'](/api/[^"\']+)["\']',
-            r'["\'](/auth/[^"\']+)["\']', 
-            r'["\'](/login[^"\']*)["\']',
-            r'["\'](/signin[^"\']*)["\']',
-            r'["\'](/session[^"\']*)["\']',
-            r'["\'](/token[^"\']*)["\']',
-            r'fetch\s*\(\s*["\']([^"\']+)["\']',
-            r'axios\.[a-z]+\s*\(\s*["\']([^"\']+)["\']',
-        ]
+        endpoints = []
+        seen = set()
+        discovered_at = now_iso()
         
-        for pattern in patterns:
-            matches = re.findall(pattern, html, re.IGNORECASE)
-            for match in matches:
-                endpoint_url = match
-                if not endpoint_url.startswith('http'):
-                    endpoint_url = urljoin(url, endpoint_url)
-                    
-                # Skip static assets
-                if any(ext in endpoint_url for ext in ['.css', '.js', '.jpg', '.png']):
-                    continue
-                    
-                method = 'POST' if any(kw in endpoint_url.lower() 
-                                     for kw in ['login', 'auth', 'signin']) else 'GET'
+        for match in _API_ENDPOINT_RE.finditer(html):
+            endpoint_url = match.group(match.lastindex)
+            if not endpoint_url.startswith('http'):
+                endpoint_url = urljoin(url, endpoint_url)
+            
+            # Pages reference the same endpoint many times
+            if endpoint_url in seen:
+                continue
+            seen.add(endpoint_url)
                 
-                endpoints.append({
-                    'url': endpoint_url,
-                    'method': method,
-                    'discovered_at': datetime.now().isoformat()
-                })
+            # Skip static assets, judged by the path's extension alone
+            endpoint_lower = endpoint_url.lower()
+            if endpoint_lower.partition('?')[0].partition('#')[0].endswith(_STATIC_EXTS):
+                continue
                 
+            # Classified once here so logins can filter on the stored flag
+            is_login = _LOGIN_KW_RE.search(endpoint_lower) is not None
+            
+            endpoints.append({
+                'url': endpoint_url,
+                'method': 'POST' if is_login else 'GET',
+                'is_login': is_login,
+                'discovered_at': discovered_at
+            })
+            
         return endpoints
         
-    def save_discovery(self, url: str, endpoints: List[Dict]) -> Path:
-        """Save discovered endpoints to domain-specific file"""
-        domain = self.get_domain(url)
+    def _write_discovery(self, domain: str, url: str, endpoints: List[Dict]) -> Path:
+        """Merge endpoints into the domain's discovery file (blocking)"""
         file_path = self.storage_dir / f"{domain}.json"
+        updated_at = now_iso()
+        endpoints = [
+            {k: v for k, v in ep.items() if k not in _SECRET_ENDPOINT_KEYS}
+            for ep in endpoints
+        ]
         
         discovery = {
             'domain': domain,
             'url': url,
-            'last_updated': datetime.now().isoformat(),
+            'last_updated': updated_at,
             'endpoints': endpoints
         }
         
         # Merge with existing if file exists
         if file_path.exists():
             try:
-                with open(file_path, 'r') as f:
-                    existing = json.load(f)
-                    existing_urls = {ep['url'] for ep in existing.get('endpoints', [])}
-                    for ep in endpoints:
-                        if ep['url'] not in existing_urls:
-                            existing['endpoints'].append(ep)
-                    discovery = existing
-                    discovery['last_updated'] = datetime.now().isoformat()
-            except:
-                pass
-                
-        with open(file_path, 'w') as f:
-            json.dump(discovery, f, indent=2)
-            
+                existing = orjson.loads(file_path.read_bytes())
+                records = existing['endpoints']
+                positions = {ep['url']: i for i, ep in enumerate(records)}
+                changed = False
+                for ep in endpoints:
+                    i = positions.get(ep['url'])
+                    if i is None:
+                        positions[ep['url']] = len(records)
+                        records.append(ep)
+                        changed = True
+                        continue
+                    # Known endpoint: take updated fields (e.g. is_login on
+                    # older records), keeping when it was first discovered
+                    merged = {**records[i], **{k: v for k, v in ep.items() if k != 'discovered_at'}}
+                    for key in _SECRET_ENDPOINT_KEYS & merged.keys():
+                        # Scrub credentials left in files by older versions
+                        del merged[key]
+                    if merged != records[i]:
+                        records[i] = merged
+                        changed = True
+                if not changed:
+                    # Nothing new for this domain; leave the file untouched
+                    return file_path
+                discovery = existing
+                discovery['last_updated'] = updated_at
+            except (OSError, orjson.JSONDecodeError, KeyError, TypeError, AttributeError) as e:
+                logger.debug(f"Replacing unreadable discovery file {file_path}: {e}")
+        
+        # Write a sibling file and swap it in, so a crash mid-write or a
+        # concurrent reader never sees a truncated file
+        tmp_path = file_path.with_name(f"{file_path.name}.{secrets.token_hex(4)}.tmp")
+        try:
+            tmp_path.write_bytes(orjson.dumps(discovery, option=orjson.OPT_INDENT_2))
+            os.replace(tmp_path, file_path)
+        except BaseException:
+            tmp_path.unlink(missing_ok=True)
+            raise
         return file_path
         
-    def get_cached_discovery(self, url: str) -> Optional[Dict]:
+    async def save_discovery(self, url: str, endpoints: List[Dict]) -> Path:
+        """Save discovered endpoints to domain-specific file"""
+        domain = self.get_domain(url)
+        lock = self._save_locks.setdefault(domain, asyncio.Lock())
+        async with lock:
+            file_path = await asyncio.to_thread(self._write_discovery, domain, url, endpoints)
+            self._cache.pop(domain, None)
+        return file_path
+        
+    async def get_cached_discovery(self, url: str) -> Optional[Dict]:
         """Get cached discovery for a domain"""
         domain = self.get_domain(url)
         file_path = self.storage_dir / f"{domain}.json"
         
-        if file_path.exists():
-            try:
-                with open(file_path, 'r') as f:
-                    return json.load(f)
-            except:
-                pass
-        return None
+        try:
+            mtime = file_path.stat().st_mtime_ns
+        except OSError:
+            self._cache.pop(domain, None)
+            return None
+        
+        # Only re-read the file when it has changed since it was last parsed
+        cached = self._cache.get(domain)
+        if cached is not None and cached[0] == mtime:
+            return cached[1]
+        
+        try:
+            discovery = orjson.loads(await asyncio.to_thread(file_path.read_bytes))
+        except (OSError, orjson.JSONDecodeError) as e:
+            logger.debug(f"Could not read discovery file {file_path}: {e}")
+            return None
+        self._cache[domain] = (mtime, discovery)
+        return discovery
 
 # Global API discovery manager
 api_discovery_manager = APIDiscoveryManager()
@@ -1409,7 +1807,7 @@ async def discover_api_endpoints(
             headers = prepare_request_headers()
             
             async with session.get(url, headers=headers, ssl=Config.SSL_VERIFY) as response:
-                html_content = await response.text()
+                html_content = await read_bounded_text(response)
             
         # Discover endpoints
         endpoints = api_discovery_manager.discover_endpoints(url, html_content)
@@ -1417,7 +1815,7 @@ async def discover_api_endpoints(
         # Save to cache if requested
         cache_file = None
         if save_to_cache and endpoints:
-            cache_file = api_discovery_manager.save_discovery(url, endpoints)
+            cache_file = await api_discovery_manager.save_discovery(url, endpoints)
             
         return {
             'success': True,
@@ -1425,7 +1823,7 @@ async def discover_api_endpoints(
             'endpoints_found': len(endpoints),
             'endpoints': endpoints,
             'cache_file': str(cache_file) if cache_file else None,
-            'timestamp': datetime.now().isoformat()
+            'timestamp': now_iso()
         }
     except Exception as e:
         return {
@@ -1445,7 +1843,7 @@ async def get_cached_api_discovery(url: str) -> Dict[str, Any]:
         Cached discovery data or empty if not found
     """
     try:
-        discovery = api_discovery_manager.get_cached_discovery(url)
+        discovery = await api_discovery_manager.get_cached_discovery(url)
         
         if discovery:
             return {
@@ -1466,6 +1864,9 @@ async def get_cached_api_discovery(url: str) -> Dict[str, Any]:
             'error': str(e)
         }
 
+# Inline JSON state that Next.js apps embed in the page
+_NEXT_DATA_XPATH = etree.XPath('string(//script[@id="__NEXT_DATA__"])')
+
 @mcp.tool()
 async def smart_login(
     login_url: str,
@@ -1487,29 +1888,38 @@ async def smart_login(
         Login result with session information
     """
     try:
+        parsed_login = urlsplit(login_url)
+        origin = f"{parsed_login.scheme}://{parsed_login.netloc}"
+        domain = api_discovery_manager.get_domain(login_url)
+        # One browser identity for every request this login makes
+        base_headers = prepare_request_headers()
+        
+        # The login page is fetched at most once; the Spring Security flow
+        # keeps (session_id, session, doc) here for the form fallback
+        login_page = None
+        
         # Special handling for Spring Security sites (like ClickBank)
         if use_spring_security or 'clickbank' in login_url.lower():
             logger.info("Using Spring Security authentication flow")
             
-            session_id = f"spring_{api_discovery_manager.get_domain(login_url)}_{secrets.token_urlsafe(8)}"
+            session_id = f"spring_{domain}_{secrets.token_urlsafe(8)}"
             session = await auth_session_manager.get_or_create_session(session_id)
             
             # Get the login page first to establish session
-            headers = prepare_request_headers()
-            async with session.get(login_url, headers=headers, ssl=Config.SSL_VERIFY) as response:
-                html = await response.text()
+            async with session.get(login_url, headers=base_headers, ssl=Config.SSL_VERIFY) as response:
+                html = await read_bounded_text(response)
+            doc = parse_html(html)
+            login_page = (session_id, session, doc)
                 
             # Extract __NEXT_DATA__ if present (for Next.js apps)
             event_id = None
-            soup = BeautifulSoup(html, 'lxml')
-            for script in soup.find_all('script'):
-                if script.get('id') == '__NEXT_DATA__':
-                    try:
-                        import json
-                        next_data = json.loads(script.string)
-                        event_id = next_data.get('props', {}).get('pageProps', {}).get('clientMetadata', {}).get('eventId')
-                    except:
-                        pass
+            next_data_json = _NEXT_DATA_XPATH(doc)
+            if next_data_json:
+                try:
+                    next_data = orjson.loads(next_data_json)
+                    event_id = next_data.get('props', {}).get('pageProps', {}).get('clientMetadata', {}).get('eventId')
+                except (orjson.JSONDecodeError, AttributeError) as e:
+                    logger.debug(f"Ignoring unusable __NEXT_DATA__ on {login_url}: {e}")
                         
             # Prepare Spring Security login data
             login_data = {
@@ -1525,57 +1935,89 @@ async def smart_login(
             login_data['_spring_security_remember_me'] = 'on'
             
             # Try Spring Security endpoint
-            headers = prepare_request_headers({
+            headers = base_headers | {
                 'Content-Type': 'application/x-www-form-urlencoded',
-                'Origin': urlparse(login_url).scheme + '://' + urlparse(login_url).netloc,
+                'Origin': origin,
                 'Referer': login_url,
-            })
+            }
             
             # Common Spring Security endpoints
             endpoints_to_try = ['/api/login', '/j_security_check', '/login', '/perform_login']
-            base_url = urlparse(login_url).scheme + '://' + urlparse(login_url).netloc
             
-            for endpoint in endpoints_to_try:
+            async def probe(endpoint: str) -> Optional[str]:
+                """POST the login to one endpoint; the redirect target if it redirected"""
                 try:
                     async with session.post(
-                        base_url + endpoint,
+                        origin + endpoint,
                         data=login_data,
                         headers=headers,
                         ssl=Config.SSL_VERIFY,
                         allow_redirects=False
                     ) as response:
                         if response.status in [302, 303]:
-                            location = response.headers.get('Location', '')
-                            
-                            # Save cookies
-                            await auth_session_manager.save_cookies(session_id)
-                            
-                            return {
-                                'success': True,
-                                'method': 'spring_security',
-                                'endpoint_used': endpoint,
-                                'session_id': session_id,
-                                'redirect': location,
-                                'has_error': 'error' in location.lower(),
-                                'message': 'Spring Security login attempted. Check redirect for success.',
-                                'timestamp': datetime.now().isoformat()
-                            }
-                except:
-                    continue
+                            return response.headers.get('Location', '')
+                except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                    logger.debug(f"Spring Security probe {endpoint} failed: {e}")
+                return None
+            
+            # Probe every endpoint at once and take the first redirect,
+            # preferring earlier endpoints when several finish together
+            probes = [asyncio.create_task(probe(endpoint)) for endpoint in endpoints_to_try]
+            pending = set(probes)
+            winner = None
+            try:
+                while pending and winner is None:
+                    done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                    for endpoint, task in zip(endpoints_to_try, probes):
+                        if task in done and task.result() is not None:
+                            winner = (endpoint, task.result())
+                            break
+            finally:
+                for task in pending:
+                    task.cancel()
+                await asyncio.gather(*pending, return_exceptions=True)
+            
+            if winner is not None:
+                endpoint, location = winner
+                
+                # Save cookies
+                await auth_session_manager.save_cookies(session_id)
+                
+                return {
+                    'success': True,
+                    'method': 'spring_security',
+                    'endpoint_used': endpoint,
+                    'session_id': session_id,
+                    'redirect': location,
+                    'has_error': 'error' in location.lower(),
+                    'message': 'Spring Security login attempted. Check redirect for success.',
+                    'timestamp': now_iso()
+                }
                     
         # Check for cached discovery
         if use_discovery:
-            discovery = api_discovery_manager.get_cached_discovery(login_url)
+            discovery = await api_discovery_manager.get_cached_discovery(login_url)
             
             if discovery and discovery.get('endpoints'):
                 # Look for login endpoints
-                login_endpoints = [
-                    ep for ep in discovery['endpoints']
-                    if any(kw in ep['url'].lower() for kw in ['login', 'auth', 'signin'])
-                    and ep.get('method') == 'POST'
-                ]
+                login_endpoints = [ep for ep in discovery['endpoints'] if is_login_endpoint(ep)]
                 
                 if login_endpoints:
+                    async def try_payload(session: aiohttp.ClientSession, url: str, payload: Dict[str, str]) -> Optional[Tuple[Dict[str, str], Any]]:
+                        """POST one payload format; (payload, response data) if it was accepted"""
+                        try:
+                            async with session.post(
+                                url,
+                                json=payload,
+                                headers={'Content-Type': 'application/json'},
+                                ssl=Config.SSL_VERIFY
+                            ) as response:
+                                if response.status == 200:
+                                    return payload, await response.json()
+                        except (aiohttp.ClientError, asyncio.TimeoutError, ValueError) as e:
+                            logger.debug(f"Login attempt at {url} failed: {e}")
+                        return None
+                    
                     # Try API-based login with discovered endpoint
                     for endpoint in login_endpoints:
                         logger.info(f"Trying discovered API endpoint: {endpoint['url']}")
@@ -1587,49 +2029,50 @@ async def smart_login(
                             {'user': username, 'pass': password},
                         ]
                         
-                        session_id = f"api_{api_discovery_manager.get_domain(login_url)}_{secrets.token_urlsafe(8)}"
+                        session_id = f"api_{domain}_{secrets.token_urlsafe(8)}"
                         session = await auth_session_manager.get_or_create_session(session_id)
                         
-                        for payload in payloads:
-                            try:
-                                async with session.post(
-                                    endpoint['url'],
-                                    json=payload,
-                                    headers={'Content-Type': 'application/json'},
-                                    ssl=Config.SSL_VERIFY
-                                ) as response:
-                                    if response.status == 200:
-                                        result_data = await response.json()
-                                        
-                                        # Save successful format for future use
-                                        endpoint['verified_payload'] = payload
-                                        api_discovery_manager.save_discovery(login_url, [endpoint])
-                                        
-                                        return {
-                                            'success': True,
-                                            'method': 'api_discovery',
-                                            'endpoint_used': endpoint['url'],
-                                            'session_id': session_id,
-                                            'response_data': result_data,
-                                            'timestamp': datetime.now().isoformat()
-                                        }
-                            except:
-                                continue
+                        # Send every format at once; the first accepted one in
+                        # list order wins
+                        attempts = await asyncio.gather(
+                            *(try_payload(session, endpoint['url'], payload) for payload in payloads)
+                        )
+                        accepted = next((attempt for attempt in attempts if attempt is not None), None)
+                        if accepted is not None:
+                            payload, result_data = accepted
+                            
+                            # Save the successful format for future use. Only the
+                            # field names are kept, never the credentials
+                            verified = {**endpoint, 'verified_payload_fields': sorted(payload)}
+                            await api_discovery_manager.save_discovery(login_url, [verified])
+                            
+                            return {
+                                'success': True,
+                                'method': 'api_discovery',
+                                'endpoint_used': endpoint['url'],
+                                'session_id': session_id,
+                                'response_data': result_data,
+                                'timestamp': now_iso()
+                            }
                                 
         # Fall back to form-based login if discovery didn't work
-        session_id = f"form_{api_discovery_manager.get_domain(login_url)}_{secrets.token_urlsafe(8)}"
-        
-        # Get or create authenticated session
-        session = await auth_session_manager.get_or_create_session(session_id)
-        
-        # First, get the login page to extract any hidden fields
-        headers = prepare_request_headers()
-        async with session.get(login_url, headers=headers, ssl=Config.SSL_VERIFY) as response:
-            html = await response.text()
+        if login_page is not None:
+            # Reuse the page and session from the Spring Security attempt, so
+            # any CSRF token in the form still matches the session's cookies
+            session_id, session, doc = login_page
+        else:
+            session_id = f"form_{domain}_{secrets.token_urlsafe(8)}"
+            
+            # Get or create authenticated session
+            session = await auth_session_manager.get_or_create_session(session_id)
+            
+            # First, get the login page to extract any hidden fields
+            async with session.get(login_url, headers=base_headers, ssl=Config.SSL_VERIFY) as response:
+                html = await read_bounded_text(response)
+            doc = parse_html(html)
         
         # Extract forms
-        soup = BeautifulSoup(html, 'lxml')
-        forms = extract_form_fields(soup)
+        forms = extract_form_fields(doc, max_forms=1)
         
         if not forms:
             return {
@@ -1653,7 +2096,7 @@ async def smart_login(
             action_url = urljoin(login_url, action_url)
         
         # Submit login form
-        headers = prepare_request_headers({'Referer': login_url})
+        headers = base_headers | {'Referer': login_url}
         
         method = form.get('method', 'POST').upper()
         if method == 'POST':
@@ -1669,8 +2112,7 @@ async def smart_login(
         await auth_session_manager.save_cookies(session_id)
         
         # Check for success
-        success_indicators = ['logout', 'sign out', 'dashboard', 'welcome', 'profile', username.lower()]
-        logged_in = any(indicator in result_html.lower() for indicator in success_indicators)
+        logged_in = looks_logged_in(result_html, username)
         
         return {
             'success': True,
@@ -1678,7 +2120,7 @@ async def smart_login(
             'session_id': session_id,
             'final_url': final_url,
             'method': 'form_fallback',
-            'timestamp': datetime.now().isoformat()
+            'timestamp': now_iso()
         }
         
     except Exception as e:
@@ -1691,8 +2133,18 @@ async def smart_login(
 # Main entry point
 # ============================================================================
 
+def install_uvloop() -> bool:
+    """Run the server on uvloop's event loop when it is installed"""
+    try:
+        import uvloop
+    except ImportError:
+        return False
+    asyncio.set_event_loop_policy(uvloop.EventLoopPolicy())
+    return True
+
 def main():
     """Main entry point for the enhanced MCP server"""
+    uvloop_enabled = install_uvloop()
     logger.info("=" * 60)
     logger.info("Starting Enhanced Web Interaction Toolkit MCP Server v0.3.0")
     logger.info("=" * 60)
@@ -1702,6 +2154,7 @@ def main():
     logger.info(f"  🔌 Max Connections: {Config.MAX_CONNECTIONS} (per host: {Config.MAX_CONNECTIONS_PER_HOST})")
     logger.info(f"  ⏱️ Rate Limit: {Config.RATE_LIMIT_REQUESTS} requests per {Config.RATE_LIMIT_PERIOD}s")
     logger.info(f"  🔄 Max Retries: {Config.MAX_RETRIES} (timeout: {Config.TIMEOUT_SECONDS}s)")
+    logger.info(f"  ⚡ Event Loop: {'uvloop' if uvloop_enabled else 'asyncio'}")
     logger.info("-" * 60)
     logger.info("To override defaults, set environment variables:")
     logger.info("  MCP_SSL_VERIFY=false     (only if absolutely necessary)")
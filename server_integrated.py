@@ -10,22 +10,29 @@ Combines all circumvention features:
 """
 
 import asyncio
-import json
+import copy
 import logging
-import secrets
+import os
 import random
 import re
+import threading
+import time
+from collections import OrderedDict
 from datetime import datetime, timedelta
+from functools import lru_cache
 from pathlib import Path
-from typing import Dict, Any, List, Optional, Tuple
-from urllib.parse import urlparse, urljoin, parse_qs
+from typing import Callable, Dict, Any, List, Optional, Tuple, Union
+from urllib.parse import urljoin, urlsplit, parse_qs
 from contextlib import asynccontextmanager
 
 import aiohttp
+import orjson
 from aiohttp import ClientTimeout, TCPConnector
-from bs4 import BeautifulSoup
+from aiohttp.typedefs import StrOrURL
 from fastmcp import FastMCP
 from pydantic import BaseModel, Field, field_validator
+import lxml.html
+from lxml import etree
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
@@ -35,14 +42,23 @@ logger = logging.getLogger(__name__)
 class Config:
     """Centralized configuration"""
     MAX_CONTENT_LENGTH = 50000
+    MAX_HTML_BYTES = 2 * 1024 * 1024  # Larger bodies are truncated before parsing
     REQUEST_TIMEOUT = 30
     MAX_RETRIES = 3
     RETRY_DELAY = 1
-    CONNECTION_LIMIT = 10
+    MAX_CONNECTIONS = 200
+    CONNECTION_LIMIT = 10  # Per host
     CACHE_TTL = 300  # 5 minutes
+    CACHE_MAX_TTL = 3600  # Upper bound for TTLs taken from Cache-Control max-age
+    CACHE_MAX_ENTRIES = 256
     API_DISCOVERY_DIR = ".api_discovery"
+    DISCOVERY_FLUSH_DELAY = 2  # Seconds to coalesce discovery writes
     SESSION_TIMEOUT = 1800  # 30 minutes
 
+# User-agent rotation and delay jitter are not security sensitive, so they
+# use a plain PRNG instead of the secrets module's system randomness
+_RNG = random.Random()
+
 # ================== Models ==================
 class ScrapeOptions(BaseModel):
     """Options for web scraping"""
@@ -62,83 +78,355 @@ class ScrapeOptions(BaseModel):
         if v < 0:
             raise ValueError("Delays must be non-negative")
         return v
+        
+    def cache_key(self) -> Tuple[Any, ...]:
+        """Values of the options that shape a scrape result, for cache keys"""
+        return tuple(self.model_dump(exclude={'min_delay', 'max_delay', 'use_cache'}).values())
+
+# ================== HTML Parsing ==================
+# lxml rejects str input carrying an XML encoding declaration, so pages are
+# handed to the parser as UTF-8 bytes with the encoding pinned. Parsing runs
+# in worker threads and lxml parsers must not be shared between threads, so
+# each thread builds its own
+_parser_local = threading.local()
+
+def _html_parser() -> lxml.html.HTMLParser:
+    """The calling thread's HTML parser"""
+    parser = getattr(_parser_local, 'parser', None)
+    if parser is None:
+        parser = _parser_local.parser = lxml.html.HTMLParser(
+            encoding='utf-8',
+            remove_comments=True,
+            collect_ids=False,
+            huge_tree=False
+        )
+    return parser
+
+_EXSLT_NS = {'re': 'http://exslt.org/regular-expressions'}
+
+# Full text of the first <title>, or '' when there is none
+_TITLE_XPATH = etree.XPath('string(//title)')
+_CSRF_META_XPATH = etree.XPath("//meta[@name='_csrf']/@content")
+_LOGIN_FORM_XPATH = etree.XPath(
+    "//form[re:test(@action, 'login|signin|auth', 'i')]",
+    namespaces=_EXSLT_NS
+)
+
+_WS_RE = re.compile(r'\s+')
+
+# Elements whose content is never visible page text
+_NON_TEXT_TAGS = ('script', 'style', 'noscript', 'svg', 'template', 'iframe')
+
+def parse_html(content: Union[str, bytes]) -> lxml.html.HtmlElement:
+    """Parse decoded HTML, or UTF-8 encoded bytes, into an lxml document tree"""
+    if isinstance(content, str):
+        content = content.encode('utf-8')
+    parser = _html_parser()
+    try:
+        return lxml.html.document_fromstring(content, parser=parser)
+    except etree.ParserError:
+        # Empty bodies (e.g. 204 responses) parse to an empty document
+        return parser.makeelement('html')
+
+async def read_body(response: aiohttp.ClientResponse, limit: int = Config.MAX_HTML_BYTES) -> bytes:
+    """Read at most `limit` bytes of a response body"""
+    chunks = []
+    total = 0
+    async for chunk in response.content.iter_chunked(65536):
+        chunks.append(chunk)
+        total += len(chunk)
+        if total >= limit:
+            break
+    raw = b''.join(chunks)
+    return raw[:limit] if total > limit else raw
+
+async def read_html(response: aiohttp.ClientResponse, limit: int = Config.MAX_HTML_BYTES) -> Tuple[bytes, str]:
+    """Read at most `limit` bytes of a response body. Returns the body as
+    UTF-8 bytes for parse_html, and decoded"""
+    raw = await read_body(response, limit)
+    charset = (response.charset or 'utf-8').lower()
+    try:
+        html = raw.decode(charset, errors='replace')
+    except LookupError:  # Unknown charset label
+        charset = 'utf-8'
+        html = raw.decode(charset, errors='replace')
+    # UTF-8 pages go to the parser as received instead of being re-encoded
+    if charset not in ('utf-8', 'utf8'):
+        raw = html.encode('utf-8')
+    return raw, html
+
+def make_url_resolver(base_url: str) -> Callable[[str], str]:
+    """Build a resolver for links found on base_url. Absolute and root-relative
+    references are joined directly; anything else, including paths with dot
+    segments that urljoin would normalize, goes through urljoin"""
+    base = urlsplit(base_url)
+    origin = f"{base.scheme}://{base.netloc}"
+    
+    def resolve(href: str) -> str:
+        if href.startswith(('http://', 'https://')):
+            return href
+        if href.startswith('/') and not href.startswith('//') and '/.' not in href:
+            return origin + href
+        return urljoin(base_url, href)
+    
+    return resolve
+
+def cookies_for_url(session: aiohttp.ClientSession, url: StrOrURL) -> Dict[str, str]:
+    """Cookies the shared jar would send to url, as a name -> value dict"""
+    return {name: morsel.value for name, morsel in session.cookie_jar.filter_cookies(url).items()}
+
+# ================== JavaScript / API Patterns ==================
+_NEXT_DATA_RE = re.compile(
+    r'<script[^>]*id="__NEXT_DATA__"[^>]*>([^<]+)</script>',
+    re.IGNORECASE
+)
+
+# JSON objects assigned to window globals: group 1 is the global's name,
+# group 2 the object literal
+_WINDOW_DATA_RE = re.compile(r'window\.(__INITIAL_STATE__|config|_env_)\s*=\s*({[^;]+});')
+
+# All endpoint patterns fused into one alternation so the page is scanned
+# once. Exactly one group participates in a match, read via m.lastindex
+_API_ENDPOINT_RE = re.compile(
+    r'["\']/(api/[^"\']+)["\']'
+    r'|fetch\(["\']([^"\']+)["\']'
+    r'|axios\.(?:get|post|put|delete)\(["\']([^"\']+)["\']'
+    r'|url:\s*["\']([^"\']+)["\']'
+    r'|endpoint:\s*["\']([^"\']+)["\']'
+    r'|["\'](https?://[^"\']+/api/[^"\']+)["\']',
+    re.IGNORECASE
+)
+
+# Keywords that hint at the authentication scheme, found in one pass
+# without lowercasing a copy of the page
+_AUTH_HINT_RE = re.compile(r'spring|/api/login|oauth|authorize', re.IGNORECASE)
+
+# Markers of a logged-in page, matched against the raw response bytes
+_LOGIN_OK_RE = re.compile(rb'logout|welcome|dashboard|sign\s*out', re.IGNORECASE)
+
+# Browser headers sent with every human-like request, after the rotated User-Agent
+_BROWSER_HEADERS = {
+    'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,image/avif,image/webp,*/*;q=0.8',
+    'Accept-Language': 'en-US,en;q=0.9',
+    'Accept-Encoding': 'br, zstd, gzip, deflate',
+    'Cache-Control': 'no-cache',
+    'Pragma': 'no-cache',
+    'Sec-Ch-Ua': '"Not A(Brand";v="121", "Google Chrome";v="121"',
+    'Sec-Ch-Ua-Mobile': '?0',
+    'Sec-Ch-Ua-Platform': '"Windows"',
+    'Sec-Fetch-Dest': 'document',
+    'Sec-Fetch-Mode': 'navigate',
+    'Sec-Fetch-Site': 'none',
+    'Sec-Fetch-User': '?1',
+    'Upgrade-Insecure-Requests': '1',
+    'DNT': '1'
+}
+
+_MAX_AGE_RE = re.compile(r'max-age\s*=\s*(\d+)', re.IGNORECASE)
+
+def cache_policy(headers: Dict[str, str]) -> Tuple[Optional[float], Dict[str, str]]:
+    """Derive a cache TTL and revalidation headers from response headers.
+    The TTL is None when the response must not be stored"""
+    lowered = {k.lower(): v for k, v in headers.items()}
+    cache_control = lowered.get('cache-control', '').lower()
+    if 'no-store' in cache_control:
+        return None, {}
+        
+    ttl = Config.CACHE_TTL
+    if 'no-cache' in cache_control:
+        ttl = 0
+    else:
+        max_age = _MAX_AGE_RE.search(cache_control)
+        if max_age:
+            ttl = min(int(max_age.group(1)), Config.CACHE_MAX_TTL)
+            
+    validators = {}
+    if 'etag' in lowered:
+        validators['If-None-Match'] = lowered['etag']
+    if 'last-modified' in lowered:
+        validators['If-Modified-Since'] = lowered['last-modified']
+    return ttl, validators
 
 # ================== API Discovery System ==================
+@lru_cache(maxsize=4096)
+def domain_for_url(url: str) -> str:
+    """Lowercased host of a URL without any leading 'www.', as used to name
+    discovery files"""
+    return urlsplit(url).netloc.lower().removeprefix('www.')
+
 class PersistentAPIDiscovery:
     """Persistent API endpoint discovery with caching"""
     
     def __init__(self, storage_dir: str = Config.API_DISCOVERY_DIR):
         self.storage_dir = Path(storage_dir)
         self.storage_dir.mkdir(exist_ok=True)
+        # Per-domain discovery without its endpoints, which live in the index
         self.discovered_apis: Dict[str, Dict[str, Any]] = {}
-        self._load_existing_discoveries()
+        # domain -> endpoint url -> endpoint, so merges update in place
+        self._endpoints: Dict[str, Dict[str, Dict[str, Any]]] = {}
+        # Domains changed in memory but not yet written to disk
+        self._dirty: set = set()
+        # File mtime (ns) each loaded or written domain was last in sync with
+        self._mtimes: Dict[str, int] = {}
+        self._flush_task: Optional[asyncio.Task] = None
+        # Held while dirty domains are written, so flushes never overlap
+        self._flush_lock = asyncio.Lock()
         
-    def _load_existing_discoveries(self):
-        """Load all existing API discoveries from storage"""
-        for json_file in self.storage_dir.glob("*.json"):
-            try:
-                with open(json_file, 'r') as f:
-                    domain = json_file.stem
-                    self.discovered_apis[domain] = json.load(f)
-                    logger.info(f"Loaded {domain}: {len(self.discovered_apis[domain].get('endpoints', []))} endpoints")
-            except Exception as e:
-                logger.error(f"Failed to load {json_file}: {e}")
-                
+    def _read_file(self, domain: str) -> Optional[Tuple[int, Dict[str, Any]]]:
+        """Read a domain's discovery file if it changed since it was last seen.
+        Returns None when the file is missing or unchanged"""
+        file_path = self.storage_dir / f"{domain}.json"
+        try:
+            mtime = file_path.stat().st_mtime_ns
+            if self._mtimes.get(domain) == mtime:
+                return None
+            return mtime, orjson.loads(file_path.read_bytes())
+        except FileNotFoundError:
+            return None
+            
+    async def _ensure_loaded(self, domain: str):
+        """Bring a domain's discovery into memory, reloading it when its file
+        was changed by another process. Files are only read on first use"""
+        if domain in self._dirty:
+            # Memory is ahead of disk until the pending write lands
+            return
+        try:
+            loaded = await asyncio.to_thread(self._read_file, domain)
+        except (OSError, orjson.JSONDecodeError) as e:
+            logger.error(f"Failed to load discovery for {domain}: {e}")
+            return
+        # A save may have landed while the file was being read
+        if loaded is not None and domain not in self._dirty:
+            self._mtimes[domain], data = loaded
+            self._endpoints[domain] = {ep['url']: ep for ep in data.pop('endpoints', [])}
+            self.discovered_apis[domain] = data
+            logger.info(f"Loaded {domain}: {len(self._endpoints[domain])} endpoints")
+            
+    def _record(self, domain: str) -> Dict[str, Any]:
+        """Materialize a domain's full discovery record, endpoints included"""
+        return {
+            **self.discovered_apis[domain],
+            'endpoints': list(self._endpoints.get(domain, {}).values())
+        }
+            
     def get_domain_from_url(self, url: str) -> str:
         """Extract domain from URL"""
-        parsed = urlparse(url)
-        domain = parsed.netloc.lower()
-        if domain.startswith('www.'):
-            domain = domain[4:]
-        return domain
-        
-    def save_discovery(self, url: str, discovery_data: Dict[str, Any]):
-        """Save discovery data for a domain"""
+        return domain_for_url(url)
+        
+    async def save_discovery(self, url: str, discovery_data: Dict[str, Any]):
+        """Merge discovery data for a domain into memory and schedule a write"""
         domain = self.get_domain_from_url(url)
-        file_path = self.storage_dir / f"{domain}.json"
+        # The write is deferred, so keep a private copy the caller cannot
+        # change (e.g. by filling credentials into form fields) before it lands
+        discovery_data = copy.deepcopy(discovery_data)
+        await self._ensure_loaded(domain)
+        
+        # Read after the load so saves racing on the same domain each see
+        # the other's merge; writes may still be pending, so disk can lag
+        existing_data = self.discovered_apis.get(domain, {})
         
-        # Merge with existing data
-        existing_data = {}
-        if file_path.exists():
-            try:
-                with open(file_path, 'r') as f:
-                    existing_data = json.load(f)
-            except:
-                pass
-                
         # Merge endpoints avoiding duplicates
-        existing_endpoints = {ep['url']: ep for ep in existing_data.get('endpoints', [])}
-        new_endpoints = {ep['url']: ep for ep in discovery_data.get('endpoints', [])}
-        existing_endpoints.update(new_endpoints)
+        endpoints = self._endpoints.setdefault(domain, {})
+        endpoints.update({ep['url']: ep for ep in discovery_data.get('endpoints', [])})
         
-        final_data = {
+        self.discovered_apis[domain] = {
             'domain': domain,
             'last_updated': datetime.now().isoformat(),
             'discovery_count': existing_data.get('discovery_count', 0) + 1,
-            'endpoints': list(existing_endpoints.values()),
             'authentication': discovery_data.get('authentication', existing_data.get('authentication', {})),
             'javascript_data': discovery_data.get('javascript_data', existing_data.get('javascript_data', {}))
         }
+        self._dirty.add(domain)
+        self._schedule_flush()
+        logger.info(f"Saved discovery for {domain}: {len(endpoints)} endpoints")
         
-        # Save to file
-        with open(file_path, 'w') as f:
-            json.dump(final_data, f, indent=2)
+    def _schedule_flush(self):
+        """Start the delayed write of dirty domains unless one is pending"""
+        if self._flush_task is None or self._flush_task.done():
+            self._flush_task = asyncio.create_task(self._delayed_flush())
             
-        self.discovered_apis[domain] = final_data
-        logger.info(f"Saved discovery for {domain}: {len(final_data['endpoints'])} endpoints")
+    async def _delayed_flush(self):
+        """Wait for writes to accumulate, then persist every dirty domain once.
+        Repeats while saves made during a write left domains dirty, stopping
+        when a round writes nothing so a failing disk is retried on the next
+        save or close() rather than in a tight loop"""
+        while self._dirty:
+            await asyncio.sleep(Config.DISCOVERY_FLUSH_DELAY)
+            if not await self.flush():
+                break
         
-    def get_discovery(self, url: str) -> Optional[Dict[str, Any]]:
+    def _write_file(self, domain: str, data: Dict[str, Any]) -> int:
+        """Atomically replace a domain's discovery file and return its mtime"""
+        file_path = self.storage_dir / f"{domain}.json"
+        # Per-process name, as the enhanced server may write the same directory
+        tmp_path = file_path.with_name(f"{file_path.name}.{os.getpid()}.tmp")
+        try:
+            tmp_path.write_bytes(orjson.dumps(data, option=orjson.OPT_INDENT_2))
+            os.replace(tmp_path, file_path)
+        except BaseException:
+            tmp_path.unlink(missing_ok=True)
+            raise
+        return file_path.stat().st_mtime_ns
+        
+    def _take_dirty(self) -> List[Tuple[str, Dict[str, Any]]]:
+        """Snapshot and clear the dirty set"""
+        pending = [(domain, self._record(domain)) for domain in self._dirty]
+        self._dirty.clear()
+        return pending
+        
+    async def flush(self) -> int:
+        """Write every dirty domain to disk without blocking the event loop.
+        Returns how many domains were written"""
+        written = 0
+        async with self._flush_lock:
+            pending = self._take_dirty()
+            for i, (domain, data) in enumerate(pending):
+                try:
+                    self._mtimes[domain] = await asyncio.to_thread(self._write_file, domain, data)
+                    written += 1
+                except OSError as e:
+                    logger.error(f"Failed to save discovery for {domain}: {e}")
+                    # Still in memory, so a later flush or close() retries it
+                    self._dirty.add(domain)
+                except asyncio.CancelledError:
+                    self._dirty.update(d for d, _ in pending[i:])
+                    raise
+        return written
+                    
+    async def close(self):
+        """Persist everything now. A delayed write that is still waiting is
+        cancelled; one that is already writing is allowed to finish"""
+        task = self._flush_task
+        if task is not None and not task.done():
+            if self._flush_lock.locked():
+                await task
+            else:
+                task.cancel()
+        await self.flush()
+        
+    async def get_discovery(self, url: str) -> Optional[Dict[str, Any]]:
         """Get cached discovery for a domain"""
         domain = self.get_domain_from_url(url)
-        return self.discovered_apis.get(domain)
+        await self._ensure_loaded(domain)
+        if domain not in self.discovered_apis:
+            return None
+        return self._record(domain)
 
 # ================== Enhanced Web Scraper ==================
 class EnhancedWebScraper:
     """Advanced web scraper with circumvention features"""
     
     def __init__(self):
-        self.sessions: Dict[str, aiohttp.ClientSession] = {}
-        self.cache: Dict[str, Tuple[Any, datetime]] = {}
+        self._session: Optional[aiohttp.ClientSession] = None
+        self._session_lock = asyncio.Lock()
+        # (url, options key) -> (result, monotonic expiry, revalidation headers),
+        # least recently used first. Expired entries with validators are kept
+        # so the next fetch can be a conditional request
+        self.cache: OrderedDict[
+            Tuple[str, Tuple[Any, ...]],
+            Tuple[Dict[str, Any], float, Dict[str, str]]
+        ] = OrderedDict()
+        self._inflight: Dict[Tuple[str, Tuple[Any, ...]], asyncio.Task] = {}
         self.api_discovery = PersistentAPIDiscovery()
         self.user_agents = [
             'Mozilla/5.0 (Windows NT 10.0; Win64; x64) Chrome/121.0.0.0',
@@ -151,52 +439,38 @@ class EnhancedWebScraper:
         if not simulate_human:
             return {'User-Agent': 'MCP-Web-Toolkit/1.0'}
             
-        return {
-            'User-Agent': secrets.choice(self.user_agents),
-            'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,image/avif,image/webp,*/*;q=0.8',
-            'Accept-Language': 'en-US,en;q=0.9',
-            'Accept-Encoding': 'gzip, deflate, br',
-            'Cache-Control': 'no-cache',
-            'Pragma': 'no-cache',
-            'Sec-Ch-Ua': '"Not A(Brand";v="121", "Google Chrome";v="121"',
-            'Sec-Ch-Ua-Mobile': '?0',
-            'Sec-Ch-Ua-Platform': '"Windows"',
-            'Sec-Fetch-Dest': 'document',
-            'Sec-Fetch-Mode': 'navigate',
-            'Sec-Fetch-Site': 'none',
-            'Sec-Fetch-User': '?1',
-            'Upgrade-Insecure-Requests': '1',
-            'DNT': '1'
-        }
+        return {'User-Agent': _RNG.choice(self.user_agents), **_BROWSER_HEADERS}
         
-    async def get_session(self, base_url: str) -> aiohttp.ClientSession:
-        """Get or create session for a domain"""
-        domain = urlparse(base_url).netloc
-        
-        if domain not in self.sessions:
-            connector = TCPConnector(limit=Config.CONNECTION_LIMIT, ssl=True)
-            timeout = ClientTimeout(total=Config.REQUEST_TIMEOUT)
-            jar = aiohttp.CookieJar()
-            self.sessions[domain] = aiohttp.ClientSession(
-                connector=connector,
-                timeout=timeout,
-                cookie_jar=jar
-            )
-            
-        return self.sessions[domain]
+    async def get_session(self) -> aiohttp.ClientSession:
+        """Get or create the session shared by all domains"""
+        if self._session is None or self._session.closed:
+            async with self._session_lock:
+                if self._session is None or self._session.closed:
+                    connector = TCPConnector(
+                        limit=Config.MAX_CONNECTIONS,
+                        limit_per_host=Config.CONNECTION_LIMIT,
+                        keepalive_timeout=75,
+                        ttl_dns_cache=300,
+                        ssl=True
+                    )
+                    timeout = ClientTimeout(total=Config.REQUEST_TIMEOUT)
+                    self._session = aiohttp.ClientSession(
+                        connector=connector,
+                        timeout=timeout,
+                        cookie_jar=aiohttp.CookieJar()
+                    )
+                    
+        return self._session
         
     def extract_javascript_data(self, html: str) -> Dict[str, Any]:
         """Extract JavaScript data including __NEXT_DATA__"""
         js_data = {}
         
         # Extract __NEXT_DATA__
-        next_data_match = re.search(
-            r'<script[^>]*id="__NEXT_DATA__"[^>]*>([^<]+)</script>',
-            html, re.IGNORECASE
-        )
+        next_data_match = _NEXT_DATA_RE.search(html)
         if next_data_match:
             try:
-                next_data = json.loads(next_data_match.group(1))
+                next_data = orjson.loads(next_data_match.group(1))
                 js_data['__NEXT_DATA__'] = next_data
                 
                 # Extract specific fields for authentication (ClickBank pattern)
@@ -210,202 +484,296 @@ class EnhancedWebScraper:
                 pass
                 
         # Extract window assignments
-        window_patterns = [
-            r'window\.__INITIAL_STATE__\s*=\s*({[^;]+});',
-            r'window\.config\s*=\s*({[^;]+});',
-            r'window\._env_\s*=\s*({[^;]+});'
-        ]
-        
-        for pattern in window_patterns:
-            matches = re.findall(pattern, html)
-            for match in matches:
-                try:
-                    parsed = json.loads(match)
-                    js_data[pattern.split('window.')[1].split('=')[0].strip()] = parsed
-                except:
-                    pass
+        for match in _WINDOW_DATA_RE.finditer(html):
+            try:
+                js_data[match.group(1)] = orjson.loads(match.group(2))
+            except:
+                pass
                     
         return js_data
         
     def extract_api_endpoints(self, html: str, base_url: str) -> List[Dict[str, Any]]:
         """Extract API endpoints from HTML/JavaScript"""
         endpoints = []
+        # The patterns overlap, so the same endpoint is usually matched more than once
+        seen = set()
+        discovered_at = datetime.now().isoformat()
+        resolve = make_url_resolver(base_url)
         
-        # Common API patterns
-        api_patterns = [
-            r'["\']/(api/[^"\']+)["\']',
-            r'fetch\(["\']([^"\']+)["\']',
-            r'axios\.[get|post|put|delete]+\(["\']([^"\']+)["\']',
-            r'url:\s*["\']([^"\']+)["\']',
-            r'endpoint:\s*["\']([^"\']+)["\']',
-            r'["\']https?://[^"\']+/api/[^"\']+["\']'
-        ]
-        
-        for pattern in api_patterns:
-            matches = re.findall(pattern, html, re.IGNORECASE)
-            for match in matches:
-                if isinstance(match, tuple):
-                    match = match[0]
-                    
-                # Make absolute URL
-                if match.startswith('/'):
-                    endpoint_url = urljoin(base_url, match)
-                elif match.startswith('http'):
-                    endpoint_url = match
-                else:
-                    endpoint_url = urljoin(base_url, '/' + match)
-                    
-                # Detect method from context
-                method = 'GET'
-                if 'login' in match.lower() or 'auth' in match.lower():
-                    method = 'POST'
-                    
-                endpoints.append({
-                    'url': endpoint_url,
-                    'method': method,
-                    'discovered_at': datetime.now().isoformat()
-                })
+        for m in _API_ENDPOINT_RE.finditer(html):
+            match = m.group(m.lastindex)
+            
+            # Make absolute URL
+            if match.startswith('/'):
+                endpoint_url = resolve(match)
+            elif match.startswith('http'):
+                endpoint_url = match
+            else:
+                endpoint_url = resolve('/' + match)
+                
+            # Detect method from context
+            method = 'GET'
+            lowered = match.lower()
+            if 'login' in lowered or 'auth' in lowered:
+                method = 'POST'
+                
+            key = (endpoint_url, method)
+            if key in seen:
+                continue
+            seen.add(key)
+            endpoints.append({
+                'url': endpoint_url,
+                'method': method,
+                'discovered_at': discovered_at
+            })
                 
         return endpoints
         
-    def detect_authentication_type(self, html: str, url: str) -> Dict[str, Any]:
-        """Detect authentication mechanism"""
-        soup = BeautifulSoup(html, 'html.parser')
+    def detect_authentication_type(
+        self,
+        html: str,
+        url: str,
+        doc: Optional[lxml.html.HtmlElement] = None
+    ) -> Dict[str, Any]:
+        """Detect authentication mechanism. Pass doc to reuse an already parsed page"""
+        if doc is None:
+            doc = parse_html(html)
         auth_info = {
             'type': 'unknown',
             'details': {}
         }
+        hints = {m.group(0).lower() for m in _AUTH_HINT_RE.finditer(html)}
         
         # Check for Spring Security
-        if 'spring' in html.lower() or '/api/login' in html:
+        if 'spring' in hints or '/api/login' in hints:
             auth_info['type'] = 'spring_security'
             auth_info['details']['login_endpoint'] = urljoin(url, '/api/login')
             
             # Look for CSRF token
-            csrf_meta = soup.find('meta', {'name': '_csrf'})
-            if csrf_meta and hasattr(csrf_meta, 'get') and csrf_meta.get('content'):
-                auth_info['details']['csrf_token'] = csrf_meta.get('content')
+            csrf_tokens = [token for token in _CSRF_META_XPATH(doc) if token]
+            if csrf_tokens:
+                auth_info['details']['csrf_token'] = csrf_tokens[0]
                 
         # Check for form-based auth
-        login_form = soup.find('form', {'action': re.compile(r'login|signin|auth', re.I)})
-        if login_form and hasattr(login_form, 'get'):
+        login_forms = _LOGIN_FORM_XPATH(doc)
+        if login_forms:
+            login_form = login_forms[0]
             auth_info['type'] = 'form_based' if auth_info['type'] == 'unknown' else 'hybrid'
-            
-            # Get form action safely
-            form_action = login_form.get('action', '/')
-            if isinstance(form_action, str):
-                auth_info['details']['form_action'] = urljoin(url, form_action)
-            else:
-                auth_info['details']['form_action'] = url
-                
-            # Get form method safely
-            form_method = login_form.get('method', 'POST')
-            if isinstance(form_method, str):
-                auth_info['details']['form_method'] = form_method.upper()
-            else:
-                auth_info['details']['form_method'] = 'POST'
+            auth_info['details']['form_action'] = urljoin(url, login_form.get('action', '/'))
+            auth_info['details']['form_method'] = login_form.get('method', 'POST').upper()
             
             # Extract form fields
             fields = {}
-            if hasattr(login_form, 'find_all'):
-                for input_field in login_form.find_all('input'):
-                    if hasattr(input_field, 'get'):
-                        field_name = input_field.get('name')
-                        if field_name:
-                            fields[field_name] = input_field.get('value', '')
+            for input_field in login_form.iter('input'):
+                field_name = input_field.get('name')
+                if field_name:
+                    fields[field_name] = input_field.get('value', '')
             auth_info['details']['form_fields'] = fields
             
         # Check for OAuth
-        if 'oauth' in html.lower() or 'authorize' in html.lower():
+        if 'oauth' in hints or 'authorize' in hints:
             auth_info['oauth_detected'] = True
             
         return auth_info
         
+    def discover_page(
+        self,
+        html: str,
+        url: str,
+        doc: Optional[lxml.html.HtmlElement] = None,
+        extract_js: bool = True
+    ) -> Dict[str, Any]:
+        """Run endpoint, authentication and JavaScript discovery over a page.
+        Touches no shared state, so it is safe to run in a worker thread"""
+        return {
+            'endpoints': self.extract_api_endpoints(html, url),
+            'authentication': self.detect_authentication_type(html, url, doc),
+            'javascript_data': self.extract_javascript_data(html) if extract_js else {}
+        }
+        
+    def _process_html(self, body: bytes, html: str, url: str, options: ScrapeOptions) -> Dict[str, Any]:
+        """Parse a fetched page and extract its discovery data and content.
+        Runs in a worker thread"""
+        doc = parse_html(body)
+        discovery_data = self.discover_page(html, url, doc, options.extract_js)
+        
+        # Extract content
+        title = _TITLE_XPATH(doc) or None
+        
+        # Extract text content. Discovery above has already seen the full
+        # page; drop subtrees that only add markup or code noise to the text
+        etree.strip_elements(doc, *_NON_TEXT_TAGS, with_tail=False)
+        # Bound the regex work on huge pages, leaving headroom for
+        # the whitespace the collapse removes
+        raw_text = doc.text_content()[:options.max_content_length * 4]
+        text = _WS_RE.sub(' ', raw_text).strip()
+        
+        # Limit content length
+        if len(text) > options.max_content_length:
+            text = text[:options.max_content_length] + "..."
+            
+        resolve = make_url_resolver(url)
+        
+        # Extract links
+        links = []
+        if options.max_links > 0:
+            for link in doc.iter('a'):
+                href = link.get('href')
+                if href is None:
+                    continue
+                links.append({
+                    'text': link.text_content().strip(),
+                    'url': resolve(href)
+                })
+                if len(links) >= options.max_links:
+                    break
+                    
+        # Extract images
+        images = []
+        if options.max_images > 0:
+            for img in doc.iter('img'):
+                src = img.get('src')
+                if src is None:
+                    continue
+                images.append({
+                    'alt': img.get('alt', ''),
+                    'url': resolve(src)
+                })
+                if len(images) >= options.max_images:
+                    break
+                    
+        return {
+            'title': title,
+            'content': text,
+            'links': links,
+            'images': images,
+            'discovery': discovery_data
+        }
+        
+    def _cache_get(self, key: Tuple[str, Tuple[Any, ...]]) -> Optional[Dict[str, Any]]:
+        """Return a fresh cached result and mark it recently used"""
+        entry = self.cache.get(key)
+        if entry is None:
+            return None
+        result, expires_at, validators = entry
+        if time.monotonic() >= expires_at:
+            if not validators:
+                # Nothing to revalidate with, so the entry is dead weight
+                del self.cache[key]
+            return None
+        self.cache.move_to_end(key)
+        return result
+        
+    def _cache_set(
+        self,
+        key: Tuple[str, Tuple[Any, ...]],
+        result: Dict[str, Any],
+        ttl: float,
+        validators: Dict[str, str]
+    ):
+        """Store a result, evicting the least recently used entries past the size cap"""
+        self.cache[key] = (result, time.monotonic() + ttl, validators)
+        self.cache.move_to_end(key)
+        while len(self.cache) > Config.CACHE_MAX_ENTRIES:
+            self.cache.popitem(last=False)
+            
+    async def _fetch_and_cache(self, key: Tuple[str, Tuple[Any, ...]], url: str, options: ScrapeOptions) -> Dict[str, Any]:
+        """Fetch a page and cache the result when the scrape succeeded. An
+        expired entry is revalidated with a conditional request"""
+        stale = self.cache.get(key)
+        validators = stale[2] if stale is not None else {}
+        result = await self._fetch_with_discovery(url, options, validators)
+        
+        if result.get('not_modified'):
+            # 304: keep the stored result, refreshing its lifetime
+            ttl, new_validators = cache_policy(result['headers'])
+            result = {**stale[0], 'cached': True, 'revalidated': True}
+            if ttl is None:
+                self.cache.pop(key, None)
+            else:
+                self._cache_set(key, stale[0], ttl, new_validators or validators)
+            return result
+            
+        if result['success']:
+            ttl, validators = cache_policy(result['headers'])
+            if ttl is None:
+                self.cache.pop(key, None)
+            else:
+                self._cache_set(key, result, ttl, validators)
+        return result
+        
     async def scrape_with_discovery(self, url: str, options: ScrapeOptions) -> Dict[str, Any]:
-        """Scrape webpage with full API discovery"""
+        """Scrape webpage with full API discovery, serving repeats from the cache.
+        Concurrent scrapes of the same page share a single fetch"""
+        if not options.use_cache:
+            return await self._fetch_with_discovery(url, options)
+            
+        key = (url, options.cache_key())
+        cached = self._cache_get(key)
+        if cached is not None:
+            return {**cached, 'cached': True}
+            
+        task = self._inflight.get(key)
+        if task is None:
+            task = asyncio.create_task(self._fetch_and_cache(key, url, options))
+            self._inflight[key] = task
+            task.add_done_callback(lambda _: self._inflight.pop(key, None))
+        # Shielded so a cancelled caller does not abort the fetch for the others
+        return dict(await asyncio.shield(task))
+        
+    async def _fetch_with_discovery(
+        self,
+        url: str,
+        options: ScrapeOptions,
+        validators: Optional[Dict[str, str]] = None
+    ) -> Dict[str, Any]:
+        """Fetch and scrape a webpage with full API discovery, bypassing the cache.
+        With validators the request is conditional, and a 304 answer is
+        returned as a result with not_modified=True and nothing extracted"""
         try:
-            session = await self.get_session(url)
+            session = await self.get_session()
             headers = self.get_headers(options.simulate_human)
+            if validators:
+                headers.update(validators)
             
             # Add delay for human simulation
             if options.simulate_human:
-                delay = random.uniform(options.min_delay, options.max_delay)
+                delay = _RNG.uniform(options.min_delay, options.max_delay)
                 await asyncio.sleep(delay)
                 
             async with session.get(url, headers=headers, allow_redirects=options.follow_redirects) as response:
-                html = await response.text()
-                
-                # Extract data
-                soup = BeautifulSoup(html, 'html.parser')
-                
-                # JavaScript extraction
-                js_data = {}
-                if options.extract_js:
-                    js_data = self.extract_javascript_data(html)
-                    
-                # API discovery
-                endpoints = self.extract_api_endpoints(html, url)
-                auth_info = self.detect_authentication_type(html, url)
-                
-                # Save discovery
-                discovery_data = {
-                    'endpoints': endpoints,
-                    'authentication': auth_info,
-                    'javascript_data': js_data
-                }
-                self.api_discovery.save_discovery(url, discovery_data)
-                
-                # Extract content
-                title = soup.title.string if soup.title else None
-                
-                # Extract text content
-                for script in soup(["script", "style"]):
-                    script.decompose()
-                text = soup.get_text()
-                lines = (line.strip() for line in text.splitlines())
-                chunks = (phrase.strip() for line in lines for phrase in line.split("  "))
-                text = ' '.join(chunk for chunk in chunks if chunk)
+                if response.status == 304 and validators:
+                    return {
+                        'success': True,
+                        'not_modified': True,
+                        'url': str(response.url),
+                        'status_code': response.status,
+                        'headers': dict(response.headers)
+                    }
+                body, html = await read_html(response)
                 
-                # Limit content length
-                if len(text) > options.max_content_length:
-                    text = text[:options.max_content_length] + "..."
-                    
-                # Extract links
-                links = []
-                for link in soup.find_all('a', href=True)[:options.max_links]:
-                    links.append({
-                        'text': link.get_text(strip=True),
-                        'url': urljoin(url, link['href'])
-                    })
-                    
-                # Extract images
-                images = []
-                for img in soup.find_all('img', src=True)[:options.max_images]:
-                    images.append({
-                        'alt': img.get('alt', ''),
-                        'url': urljoin(url, img['src'])
-                    })
-                    
-                # Get cookies
-                cookies = {}
-                for cookie in session.cookie_jar:
-                    cookies[cookie.key] = cookie.value
-                    
-                return {
-                    'success': True,
-                    'url': str(response.url),
-                    'title': title,
-                    'content': text,
-                    'links': links,
-                    'images': images,
-                    'status_code': response.status,
-                    'headers': dict(response.headers),
-                    'cookies': cookies,
-                    'discovery': discovery_data,
-                    'cached': False,
-                    'timestamp': datetime.now().isoformat()
-                }
+            # Parsing and extraction are CPU bound, keep them off the event loop
+            page = await asyncio.to_thread(self._process_html, body, html, url, options)
+            await self.api_discovery.save_discovery(url, page['discovery'])
+            
+            # Get cookies
+            cookies = cookies_for_url(session, response.url)
                 
+            return {
+                'success': True,
+                'url': str(response.url),
+                'title': page['title'],
+                'content': page['content'],
+                'links': page['links'],
+                'images': page['images'],
+                'status_code': response.status,
+                'headers': dict(response.headers),
+                'cookies': cookies,
+                'discovery': page['discovery'],
+                'cached': False,
+                'timestamp': datetime.now().isoformat()
+            }
+            
         except Exception as e:
             logger.error(f"Scraping error: {e}")
             return {
@@ -429,29 +797,22 @@ class EnhancedWebScraper:
             # Check for cached discovery
             discovery = None
             if use_discovery:
-                discovery = self.api_discovery.get_discovery(login_url)
+                discovery = await self.api_discovery.get_discovery(login_url)
                 
-            session = await self.get_session(login_url)
+            session = await self.get_session()
             headers = self.get_headers(simulate_human=True)
             
             # First, load the login page
             async with session.get(login_url, headers=headers) as response:
-                html = await response.text()
+                _, html = await read_html(response)
                 
             # Detect authentication type if not in cache
             if not discovery:
-                auth_info = self.detect_authentication_type(html, login_url)
-                endpoints = self.extract_api_endpoints(html, login_url)
-                js_data = self.extract_javascript_data(html)
-                
-                discovery = {
-                    'authentication': auth_info,
-                    'endpoints': endpoints,
-                    'javascript_data': js_data
-                }
+                discovery = await asyncio.to_thread(self.discover_page, html, login_url)
+                auth_info = discovery['authentication']
                 
                 # Save discovery
-                self.api_discovery.save_discovery(login_url, discovery)
+                await self.api_discovery.save_discovery(login_url, discovery)
             else:
                 auth_info = discovery.get('authentication', {})
                 
@@ -496,9 +857,7 @@ class EnhancedWebScraper:
                         response_data = {'text': await login_response.text()}
                         
                     # Get session cookies
-                    cookies = {}
-                    for cookie in session.cookie_jar:
-                        cookies[cookie.key] = cookie.value
+                    cookies = cookies_for_url(session, login_response.url)
                         
                     return {
                         'success': login_response.status in [200, 302],
@@ -513,14 +872,14 @@ class EnhancedWebScraper:
             elif auth_info.get('type') in ['form_based', 'hybrid']:
                 # Traditional form login
                 form_action = auth_info['details'].get('form_action', login_url)
-                form_fields = auth_info['details'].get('form_fields', {})
-                
-                # Update form fields with credentials
-                form_fields.update({
+                # Fill in credentials on a copy; the discovered fields are
+                # shared with the discovery store and must stay secret-free
+                form_fields = {
+                    **auth_info['details'].get('form_fields', {}),
                     'username': username,
                     'email': username,  # Some forms use email
                     'password': password
-                })
+                }
                 
                 headers['Content-Type'] = 'application/x-www-form-urlencoded'
                 
@@ -532,19 +891,15 @@ class EnhancedWebScraper:
                 ) as login_response:
                     
                     final_url = str(login_response.url)
-                    response_html = await login_response.text()
+                    body = await read_body(login_response)
                     
                     # Check for success indicators
-                    success = (
-                        login_response.status == 200 and
+                    success = login_response.status in (200, 302) and (
                         'dashboard' in final_url.lower() or
-                        'welcome' in response_html.lower() or
-                        'logout' in response_html.lower()
+                        _LOGIN_OK_RE.search(body) is not None
                     )
                     
-                    cookies = {}
-                    for cookie in session.cookie_jar:
-                        cookies[cookie.key] = cookie.value
+                    cookies = cookies_for_url(session, login_response.url)
                         
                     return {
                         'success': success,
@@ -572,14 +927,23 @@ class EnhancedWebScraper:
             
     async def cleanup(self):
         """Clean up resources"""
-        for session in self.sessions.values():
-            await session.close()
-        self.sessions.clear()
+        if self._session is not None:
+            await self._session.close()
+            self._session = None
         self.cache.clear()
+        await self.api_discovery.close()
 
 # ================== MCP Server ==================
+@asynccontextmanager
+async def server_lifespan(server: FastMCP):
+    """Close the HTTP session and flush pending discovery writes on shutdown"""
+    try:
+        yield
+    finally:
+        await scraper.cleanup()
+
 # Initialize FastMCP server
-mcp = FastMCP("mcp-web-interaction-toolkit-integrated")
+mcp = FastMCP("mcp-web-interaction-toolkit-integrated", lifespan=server_lifespan)
 scraper = EnhancedWebScraper()
 
 @mcp.tool()
@@ -649,18 +1013,10 @@ async def discover_api_endpoints(
             return result
         discovery = result.get('discovery', {})
     else:
-        endpoints = scraper.extract_api_endpoints(html_content, url)
-        auth_info = scraper.detect_authentication_type(html_content, url)
-        js_data = scraper.extract_javascript_data(html_content)
-        
-        discovery = {
-            'endpoints': endpoints,
-            'authentication': auth_info,
-            'javascript_data': js_data
-        }
+        discovery = await asyncio.to_thread(scraper.discover_page, html_content, url)
         
         if save_to_cache:
-            scraper.api_discovery.save_discovery(url, discovery)
+            await scraper.api_discovery.save_discovery(url, discovery)
             
     return {
         'success': True,
@@ -679,7 +1035,7 @@ async def get_cached_discovery(url: str) -> Dict[str, Any]:
     Returns:
         Cached discovery data or None
     """
-    discovery = scraper.api_discovery.get_discovery(url)
+    discovery = await scraper.api_discovery.get_discovery(url)
     
     if discovery:
         return {
@@ -717,11 +1073,18 @@ async def extract_javascript_data(url: str) -> Dict[str, Any]:
     else:
         return result
 
-# Note: FastMCP handles cleanup automatically
-# Manual cleanup can be done if needed by calling scraper.cleanup()
+def install_uvloop() -> bool:
+    """Run the server on uvloop's event loop when it is installed"""
+    try:
+        import uvloop
+    except ImportError:
+        return False
+    asyncio.set_event_loop_policy(uvloop.EventLoopPolicy())
+    return True
 
 def main():
     """Main entry point for the MCP server"""
+    install_uvloop()
     mcp.run()
 
 if __name__ == "__main__":